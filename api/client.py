@@ -0,0 +1,152 @@
+import asyncio
+import json
+import time
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+# Statuses that are worth trying again after a short wait
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class Response:
+    """The parts of a response that callers use, read up front so
+    the connection can go straight back to the pool"""
+    def __init__(
+        self,
+        status: int,
+        body: str
+    ) -> None:
+        self.status = status
+        self.body = body
+
+    async def text(self) -> str:
+        return self.body
+
+    async def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class HttpClient:
+    """One aiohttp session, shared by everything that talks to
+    other web services (Tenor, bot lists, Patreon)"""
+    def __init__(self) -> None:
+        self.session = None
+        self.pool_size = 100
+        self.per_host = 10
+        self.dns_ttl = 300
+        self.timeout = 10
+        self.retries = 2
+        self.backoff = 0.5
+        # {host: {'requests', 'errors', 'retries', 'time', 'max'}}
+        self.stats = {}
+
+    def configure(
+        self,
+        pool_size: Optional[int] = None,
+        per_host: Optional[int] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None
+    ) -> None:
+        """Changes the settings used for the session. Only
+        takes effect if called before the first request."""
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if per_host is not None:
+            self.per_host = per_host
+        if timeout is not None:
+            self.timeout = timeout
+        if retries is not None:
+            self.retries = retries
+        if backoff is not None:
+            self.backoff = backoff
+
+    def max_request_time(self) -> float:
+        """The longest a request can take, when every attempt
+        times out and is retried after its backoff"""
+        return self.timeout * (self.retries + 1)\
+            + self.backoff * (2**self.retries - 1)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size, limit_per_host=self.per_host,
+                ttl_dns_cache=self.dns_ttl
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self.session
+
+    def _record(
+        self,
+        host: str,
+        elapsed: float,
+        error: bool,
+        retried: bool
+    ) -> None:
+        stats = self.stats.setdefault(host, {
+            'requests': 0, 'errors': 0, 'retries': 0, 'time': 0.0, 'max': 0.0
+        })
+        stats['requests'] += 1
+        stats['errors'] += int(error)
+        stats['retries'] += int(retried)
+        stats['time'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> Response:
+        """Makes a request, retrying with exponential backoff on
+        connection errors, timeouts and 429/5xx responses"""
+        host = urlparse(url).netloc
+        session = self._get_session()
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url, **kwargs) as r:
+                    response = Response(r.status, await r.text())
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                retry = attempt < self.retries
+                self._record(host, time.perf_counter() - start, True, retry)
+                if not retry:
+                    raise
+            else:
+                retry = response.status in RETRY_STATUSES\
+                    and attempt < self.retries
+                self._record(
+                    host, time.perf_counter() - start,
+                    response.status >= 400, retry
+                )
+                if not retry:
+                    return response
+            await asyncio.sleep(self.backoff * 2**attempt)
+            attempt += 1
+
+    async def get(
+        self,
+        url: str,
+        **kwargs
+    ) -> Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(
+        self,
+        url: str,
+        **kwargs
+    ) -> Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+
+client = HttpClient()
@@ -1,13 +1,32 @@
-from aiohttp_requests import requests
+from api.client import client
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from dotenv import load_dotenv
 import json
 import asyncio
 import os
+import sqlite3
+import time
 
 load_dotenv()
 
 APIKEY = os.getenv('APIKEY')
+API_URL = os.getenv('TENOR_API_URL', 'https://api.tenor.com/v1')
+# Optional path to an sqlite file, so looked up urls survive restarts
+CACHE_PATH = os.getenv('TENOR_CACHE_PATH')
+
+CACHE_SIZE = 1000
+CACHE_TTL = 60*60*24  # seconds
+
+# {gifid: (expires_at, url)}, least recently used first
+_cache = OrderedDict()
+# {gifid: asyncio.Future}, lookups that are currently running
+_inflight = {}
+# sqlite connections can only be used by the thread that opened them,
+# so all disk access happens on this one thread
+_disk_executor = ThreadPoolExecutor(max_workers=1)
+_disk = None
 
 
 def _simplify(
@@ -28,11 +47,61 @@ def get_gif_id(
     return gif_id
 
 
-async def get_gif_url(
+def _open_disk() -> Optional[sqlite3.Connection]:
+    global _disk
+    if _disk is None and CACHE_PATH is not None:
+        _disk = sqlite3.connect(CACHE_PATH)
+        _disk.execute(
+            """CREATE TABLE IF NOT EXISTS gifs (
+                id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                expires REAL NOT NULL
+            )"""
+        )
+    return _disk
+
+
+def _disk_get(
     gifid: str
 ) -> Optional[str]:
-    r = await requests.get(
-        f"https://api.tenor.com/v1/gifs?ids={gifid}&key={APIKEY}"
+    disk = _open_disk()
+    if disk is None:
+        return None
+    row = disk.execute(
+        "SELECT url FROM gifs WHERE id=? AND expires>?", (gifid, time.time())
+    ).fetchone()
+    return row[0] if row is not None else None
+
+
+def _disk_set(
+    gifid: str,
+    url: str
+) -> None:
+    disk = _open_disk()
+    if disk is None:
+        return
+    with disk:
+        disk.execute(
+            "INSERT OR REPLACE INTO gifs (id, url, expires) VALUES (?, ?, ?)",
+            (gifid, url, time.time() + CACHE_TTL)
+        )
+
+
+def _remember(
+    gifid: str,
+    url: str
+) -> None:
+    _cache[gifid] = (time.monotonic() + CACHE_TTL, url)
+    _cache.move_to_end(gifid)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+async def fetch_gif_url(
+    gifid: str
+) -> Optional[str]:
+    r = await client.get(
+        f"{API_URL}/gifs?ids={gifid}&key={APIKEY}"
     )
 
     if r.status == 200:
@@ -43,6 +112,51 @@ async def get_gif_url(
         return None
 
 
+async def _lookup(
+    gifid: str
+) -> Optional[str]:
+    loop = asyncio.get_event_loop()
+    try:
+        url = await loop.run_in_executor(_disk_executor, _disk_get, gifid)
+    except sqlite3.Error as e:
+        # The disk cache is only a cache, so fall back to the API
+        print(f"Tenor disk cache lookup failed: {e}")
+        url = None
+    if url is None:
+        url = await fetch_gif_url(gifid)
+        if url is not None:
+            try:
+                await loop.run_in_executor(
+                    _disk_executor, _disk_set, gifid, url
+                )
+            except sqlite3.Error as e:
+                print(f"Tenor disk cache write failed: {e}")
+    if url is not None:
+        _remember(gifid, url)
+    return url
+
+
+async def get_gif_url(
+    gifid: str
+) -> Optional[str]:
+    """Returns the url of the GIF, from the cache if possible.
+    Concurrent lookups of the same GIF share one request."""
+    cached = _cache.get(gifid)
+    if cached is not None:
+        if cached[0] > time.monotonic():
+            _cache.move_to_end(gifid)
+            return cached[1]
+        del _cache[gifid]
+
+    future = _inflight.get(gifid)
+    if future is None:
+        future = asyncio.ensure_future(_lookup(gifid))
+        _inflight[gifid] = future
+        future.add_done_callback(lambda _: _inflight.pop(gifid, None))
+    return await asyncio.shield(future)
+
+
+# Run from the repository root with python -m api.tenor
 if __name__ == '__main__':
     loop = asyncio.get_event_loop()
     url = input("URL: ")
@@ -52,3 +166,4 @@ if __name__ == '__main__':
     else:
         gif_url = loop.run_until_complete(get_gif_url(gifid))
         print(f"GIF URL: {gif_url}")
+    loop.run_until_complete(client.close())
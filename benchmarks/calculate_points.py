@@ -0,0 +1,245 @@
+"""Compares calculate_points with the implementation it replaced.
+
+Both run against the same stand-in database, which answers every query
+from an in-memory fixture after ROUND_TRIP seconds, and counts the
+queries. Run from the repository root with:
+
+    python -m benchmarks.calculate_points
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import List, Tuple
+
+import discord
+from discord.ext import commands
+
+import functions
+from database.database import Database
+
+ROUND_TRIP = 0.0005  # seconds per query
+
+GUILD_ID = 1
+STARBOARD_ID = 2
+BLACKLISTED_ROLE = 5
+EMOJIS = ['⭐', '🌟']
+
+
+async def baseline_calculate_points(
+    sql_message: dict,
+    sql_starboard: dict,
+    bot: commands.Bot,
+    guild: discord.Guild
+) -> Tuple[int, List[dict]]:
+    """calculate_points as it was before it used a single
+    set-based query, unchanged apart from the name"""
+    get_reactions = \
+        """SELECT * FROM reactions WHERE message_id=$1"""
+    get_user = \
+        """SELECT * FROM users WHERE id=$1"""
+    get_sbemojis = \
+        """SELECT * FROM sbemojis WHERE starboard_id=$1"""
+    update_message = \
+        """UPDATE messages
+        SET points=$1
+        WHERE orig_message_id=$2
+        AND channel_id=$3"""
+
+    message_id = int(sql_message['id'])
+    self_star = sql_starboard['self_star']
+
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            emojis = await conn.fetch(get_sbemojis, sql_starboard['id'])
+            all_reactions = await conn.fetch(get_reactions, message_id)
+
+    used_users = set()
+
+    total_points = 0
+    for emoji_obj in emojis:
+        emoji_id = int(emoji_obj['d_id']) if emoji_obj['d_id'] is not None\
+            else None
+        emoji_name = None if emoji_id is not None else emoji_obj['name']
+        reactions = [
+            r for r in all_reactions if r['name']
+            in [str(emoji_id), emoji_name]
+        ]
+        for sql_reaction in reactions:
+            user_id = sql_reaction['user_id']
+            if user_id in used_users:
+                continue
+            used_users.add(user_id)
+            if user_id == sql_message['user_id'] and self_star is False:
+                continue
+
+            async with bot.db.acquire() as conn:
+                async with conn.transaction():
+                    sql_user = await conn.fetchrow(get_user, user_id)
+
+            if sql_user['is_bot'] is True:
+                continue
+
+            member_list = await functions.get_members(
+                [int(sql_user['id'])], guild
+            )
+            try:
+                member = member_list[0]
+                if member and await functions.is_user_blacklisted(
+                    bot, member, int(sql_starboard['id'])
+                ):
+                    continue
+            except IndexError:
+                pass
+
+            total_points += 1
+
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                update_message, total_points,
+                message_id, int(sql_starboard['id'])
+            )
+
+    return total_points, emojis
+
+
+class Fixture:
+    """The rows of one guild with one starboard and one message,
+    with a reaction from every voter for each of the EMOJIS.
+    Every 10th voter is a bot, every 20th has the blacklisted role."""
+    def __init__(
+        self,
+        voters: int
+    ) -> None:
+        self.users = {
+            uid: {'id': uid, 'is_bot': uid % 10 == 0}
+            for uid in range(1, voters + 1)
+        }
+        self.reactions = [
+            {'user_id': uid, 'name': name, 'message_id': 1}
+            for uid in self.users for name in EMOJIS
+        ]
+        self.starboard = {
+            'id': STARBOARD_ID, 'guild_id': GUILD_ID, 'self_star': False
+        }
+        self.sbemojis = [
+            {'d_id': None, 'name': name, 'starboard_id': STARBOARD_ID}
+            for name in EMOJIS
+        ]
+        self.rolebl = [{
+            'starboard_id': STARBOARD_ID, 'role_id': BLACKLISTED_ROLE,
+            'guild_id': GUILD_ID, 'is_whitelist': False
+        }]
+        self.queries = 0
+
+    def answer(
+        self,
+        sql: str,
+        args: tuple
+    ) -> List[dict]:
+        if 'DISTINCT reactions.user_id' in sql:
+            return [
+                {'user_id': r['user_id'], 'name': r['name']}
+                for r in self.reactions
+                if not self.users[r['user_id']]['is_bot']
+            ]
+        if 'FROM reactions' in sql:
+            return self.reactions
+        if 'FROM users' in sql:
+            return [self.users[args[0]]]
+        if 'FROM starboards' in sql:
+            return [self.starboard]
+        if 'FROM sbemojis' in sql:
+            return self.sbemojis
+        if 'FROM rolebl' in sql:
+            return self.rolebl
+        return []
+
+
+class StandInConn:
+    def __init__(
+        self,
+        fixture: Fixture
+    ) -> None:
+        self.fixture = fixture
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetch(self, sql: str, *args) -> List[dict]:
+        self.fixture.queries += 1
+        await asyncio.sleep(ROUND_TRIP)
+        return self.fixture.answer(sql, args)
+
+    async def fetchrow(self, sql: str, *args) -> dict:
+        rows = await self.fetch(sql, *args)
+        return rows[0] if rows != [] else None
+
+    async def execute(self, sql: str, *args) -> None:
+        await self.fetch(sql, *args)
+
+
+def stand_in_bot(
+    fixture: Fixture
+) -> SimpleNamespace:
+    db = Database()
+
+    @asynccontextmanager
+    async def acquire():
+        yield StandInConn(fixture)
+
+    db.acquire = acquire
+    return SimpleNamespace(db=db)
+
+
+def stand_in_guild(
+    fixture: Fixture
+) -> SimpleNamespace:
+    guild = SimpleNamespace(id=GUILD_ID)
+    members = {
+        uid: SimpleNamespace(
+            id=uid, guild=guild,
+            roles=[SimpleNamespace(id=uid % 20)]
+        )
+        for uid in fixture.users
+    }
+    guild.get_member = members.get
+    return guild
+
+
+async def measure(
+    func,
+    voters: int
+) -> Tuple[int, int, float]:
+    """Returns the points, queries and seconds of one call"""
+    fixture = Fixture(voters)
+    bot = stand_in_bot(fixture)
+    guild = stand_in_guild(fixture)
+    sql_message = {'id': 1, 'user_id': 0}
+
+    # Both read the role blacklist from the guild config cache,
+    # which is warm for any guild that gets reactions
+    await bot.db.config_cache.get(GUILD_ID)
+    fixture.queries = 0
+
+    start = time.perf_counter()
+    points, _ = await func(sql_message, fixture.starboard, bot, guild)
+    return points, fixture.queries, time.perf_counter() - start
+
+
+async def main() -> None:
+    for voters in [10, 100, 1000]:
+        old = await measure(baseline_calculate_points, voters)
+        new = await measure(functions.calculate_points, voters)
+        assert old[0] == new[0], (old, new)
+        print(
+            f"{voters} voters, {old[0]} points: "
+            f"before {old[1]} queries {old[2]*1e3:.1f} ms, "
+            f"after {new[1]} queries {new[2]*1e3:.1f} ms"
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""Compares CooldownMapping lookups on a mapping with a million keys
+with the old behaviour, which swept every key on every call. Run
+from the repository root with:
+
+    python -m benchmarks.cooldowns
+"""
+import time
+
+from cooldowns import CooldownMapping
+
+
+class SweepingCooldownMapping(CooldownMapping):
+    """The old behaviour, which looked at every key on every call"""
+    def _verify_cache_integrity(self, current=None):
+        current = current or time.time()
+        dead_keys = [
+            k for k, v in self._cache.items()
+            if current > v._last + v.per
+        ]
+        for k in dead_keys:
+            del self._cache[k]
+
+
+def main() -> None:
+    keys = 1_000_000
+    now = time.time()
+
+    for cls, lookups in [
+        (SweepingCooldownMapping, 10), (CooldownMapping, 1_000_000)
+    ]:
+        # Filled directly, since filling the old mapping through
+        # get_bucket would take quadratic time
+        mapping = cls.from_cooldown(3, 60)
+        for key in range(keys):
+            bucket = mapping._cooldown.copy()
+            bucket.update_rate_limit(now)
+            mapping._cache[key] = bucket
+            mapping._expiry.append((now + bucket.per, key))
+
+        start = time.perf_counter()
+        for i in range(lookups):
+            mapping.update_rate_limit(i % keys, now + 1)
+        per_call = (time.perf_counter() - start) / lookups
+        print(
+            f"{cls.__name__}: {keys} keys, "
+            f"{per_call * 1e6:.2f} us per lookup"
+        )
+
+    # Every key expires at once, and is cleared out by a single call
+    start = time.perf_counter()
+    mapping.get_bucket(-1, now + 120)
+    print(
+        f"expiring {keys} keys took "
+        f"{(time.perf_counter() - start) * 1000:.0f} ms, "
+        f"{len(mapping._cache)} left"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Rough load test against the local database. Runs the same batch
+of queries with different pool sizes and prints the throughput of
+each. Run from the repository root with:
+
+    python -m benchmarks.db_pool
+"""
+import asyncio
+import time
+
+from database.database import Database
+
+
+async def run_load(
+    size: int,
+    queries: int = 2000,
+    workers: int = 50
+) -> float:
+    db = Database(min_size=size, max_size=size)
+    db.pool = await db.make_pool()
+    remaining = [queries]
+
+    async def worker() -> None:
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            async with db.acquire() as conn:
+                async with conn.transaction():
+                    await conn.fetchval("SELECT pg_sleep(0.002)")
+
+    s = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(workers)])
+    elapsed = time.perf_counter() - s
+    await db.close()
+    return queries / elapsed
+
+
+async def main() -> None:
+    for size in [1, 2, 5, 10, 20]:
+        qps = await run_load(size)
+        print(f"Pool size {size}: {round(qps)} queries/second")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""Compares building a starboard embed with reusing the cached one.
+
+Run from the repository root with:
+
+    python -m benchmarks.embed_cache
+"""
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+
+import discord
+
+import functions
+
+
+class Author:
+    avatar_url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+    def __str__(self) -> str:
+        return "Author#0001"
+
+
+def stand_in_message(
+    message_id: int,
+    fields: int
+) -> SimpleNamespace:
+    """A message with 5 rich embeds of the given number of fields"""
+    rich = discord.Embed(title="Title", description="x"*1000)
+    for i in range(fields):
+        rich.add_field(name=f"Field {i}", value="y"*200)
+    rich.set_footer(text="Footer")
+    rich.set_image(url="https://example.com/image.png")
+    return SimpleNamespace(
+        id=message_id, edited_at=None,
+        created_at=datetime.datetime.utcnow(),
+        channel=SimpleNamespace(is_nsfw=lambda: False),
+        author=Author(), attachments=[], embeds=[rich] * 5,
+        system_content="z"*500,
+        jump_url="https://discord.com/channels/1/2/3"
+    )
+
+
+async def bench(
+    func,
+    message: SimpleNamespace,
+    runs: int
+) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        await func(message)
+    return (time.perf_counter() - start) / runs
+
+
+async def main() -> None:
+    runs = 2000
+    for fields in [0, 10, 25]:
+        message = stand_in_message(fields + 1, fields)
+        rendered = await bench(functions.render_embed, message, runs)
+        cached = await bench(functions.get_embed_from_message, message, runs)
+        print(
+            f"{fields*5} fields: render {rendered*1e6:.1f} us, "
+            f"cached {cached*1e6:.1f} us"
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -4,9 +4,12 @@ import asyncio
 import os
 import dotenv
 import functions
+import metrics
 import pretty_help
 from discord.ext import commands
 from asyncio import Lock
+from api.client import client as http_client
+from cogs.levels import flush_xp, unload_flushes
 
 dotenv.load_dotenv()
 
@@ -27,7 +30,18 @@ To get started, run the "setup" command.
 If you need help, just mention me for a link to the support server.
 """
 
-db = Database()
+db = Database(
+    min_size=bot_config.DB_POOL_MIN_SIZE,
+    max_size=bot_config.DB_POOL_MAX_SIZE,
+    cache_options={
+        'limit': bot_config.MESSAGE_CACHE_GUILD_SIZE,
+        'max_size': bot_config.MESSAGE_CACHE_SIZE,
+        'max_bytes': bot_config.MESSAGE_CACHE_BYTES,
+        'ttl': bot_config.MESSAGE_CACHE_TTL
+    },
+    message_rows_size=bot_config.MESSAGE_ROW_CACHE_SIZE,
+    known_rows_size=bot_config.KNOWN_ROWS_SIZE
+)
 
 emojis = bot_config.PAGINATOR_EMOJIS
 navigation = pretty_help.Navigation(
@@ -69,6 +83,7 @@ bot = Bot(
     shard_count=bot_config.SHARD_COUNT,
     chunk_guilds_at_startup=False
 )
+metrics.instrument_http(bot)
 web_server = HttpWebHook(bot, db)
 
 
@@ -79,9 +94,9 @@ async def load_aschannels(
     check_aschannel = \
         """SELECT * FROM aschannels"""
 
-    async with bot.db.lock:
-        async with bot.db.conn.transaction():
-            asc = await bot.db.conn.fetch(
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            asc = await conn.fetch(
                 check_aschannel
             )
 
@@ -92,6 +107,13 @@ async def load_aschannels(
 
 
 async def main() -> None:
+    http_client.configure(
+        pool_size=bot_config.HTTP_POOL_SIZE,
+        per_host=bot_config.HTTP_POOL_PER_HOST,
+        timeout=bot_config.HTTP_TIMEOUT,
+        retries=bot_config.HTTP_RETRIES,
+        backoff=bot_config.HTTP_BACKOFF
+    )
     await db.open(bot)
 
     await load_aschannels(bot)
@@ -133,4 +155,10 @@ if __name__ == '__main__':
         print("Logging out")
         loop.run_until_complete(bot.logout())
         loop.run_until_complete(web_server.close())
+        loop.run_until_complete(http_client.close())
+        loop.run_until_complete(
+            asyncio.gather(*unload_flushes, return_exceptions=True)
+        )
+        loop.run_until_complete(flush_xp(bot))
+        loop.run_until_complete(db.close())
         exit(1)
@@ -3,6 +3,8 @@ from typing import Dict
 import discord
 from discord.ext import commands
 
+from cogs.xproles import thresholds
+
 
 async def clean_all(
     bot: commands.Bot,
@@ -16,6 +18,7 @@ async def clean_all(
     pr = await clean_posroles(bot, guild)
     cb = await clean_channelbl(bot, guild)
     rb = await clean_rolebl(bot, guild)
+    bot.db.config_cache.invalidate(guild.id)
     return {
         'starboards': s,
         'aschannels': a,
@@ -32,9 +35,8 @@ async def clean_starboards(
     bot: commands.Bot,
     guild: discord.Guild
 ) -> int:
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             starboards = await conn.fetch(
                 """SELECT * FROM starboards
@@ -49,7 +51,7 @@ async def clean_starboards(
         if channel is None:
             to_delete.append(sid)
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """DELETE FROM starboards
@@ -64,9 +66,8 @@ async def clean_aschannels(
     bot: commands.Bot,
     guild: discord.Guild
 ) -> int:
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             aschannels = await conn.fetch(
                 """SELECT * FROM starboards
@@ -81,7 +82,7 @@ async def clean_aschannels(
         if channel is None:
             to_delete.append(aid)
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """DELETE FROM aschannels
@@ -96,9 +97,8 @@ async def clean_sbemojis(
     bot: commands.Bot,
     guild: discord.Guild
 ) -> int:
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             starboard_ids = [
                 int(s['id']) for s in await conn.fetch(
@@ -123,7 +123,7 @@ async def clean_sbemojis(
         if emoji_obj is None:
             to_delete.append(str(eid))
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """DELETE FROM sbemojis
@@ -138,9 +138,8 @@ async def clean_asemojis(
     bot: commands.Bot,
     guild: discord.Guild
 ) -> int:
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             aschannels_ids = [
                 int(s['id']) for s in await conn.fetch(
@@ -165,7 +164,7 @@ async def clean_asemojis(
         if emoji_obj is None:
             to_delete.append(str(eid))
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """DELETE FROM asemojis
@@ -180,9 +179,8 @@ async def clean_xproles(
     bot: commands.Bot,
     guild: discord.Guild
 ) -> int:
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             xproles = await conn.fetch(
                 """SELECT * FROM xproles
@@ -197,7 +195,7 @@ async def clean_xproles(
         if role is None:
             to_delete.append(rid)
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """DELETE FROM xproles
@@ -205,6 +203,7 @@ async def clean_xproles(
                 to_delete
             )
 
+    thresholds.pop(guild.id, None)
     return len(to_delete)
 
 
@@ -212,9 +211,8 @@ async def clean_posroles(
     bot: commands.Bot,
     guild: discord.Guild
 ) -> int:
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             posroles = await conn.fetch(
                 """SELECT * FROM posroles
@@ -229,7 +227,7 @@ async def clean_posroles(
         if role is None:
             to_delete.append(rid)
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """DELETE FROM posroles
@@ -244,9 +242,8 @@ async def clean_channelbl(
     bot: commands.Bot,
     guild: discord.Guild
 ) -> int:
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             channelbl = await conn.fetch(
                 """SELECT * FROM channelbl
@@ -261,7 +258,7 @@ async def clean_channelbl(
         if channel is None:
             to_delete.append(cid)
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """DELETE FROM channelbl
@@ -276,9 +273,8 @@ async def clean_rolebl(
     bot: commands.Bot,
     guild: discord.Guild
 ) -> int:
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             rolebl = await conn.fetch(
                 """SELECT * FROM rolebl
@@ -293,7 +289,7 @@ async def clean_rolebl(
         if role is None:
             to_delete.append(rid)
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """DELETE FROM rolebl
@@ -63,24 +63,15 @@ class AutoStarChannels(commands.Cog):
         )
         if retry_after:
             return
-        get_emojis = \
-            """SELECT * FROM asemojis WHERE aschannel_id=$1"""
 
         channel = message.channel
         guild = message.guild
-        conn = self.bot.db.conn
 
         valid = True
         reason = None
 
-        check_aschannel = \
-            """SELECT * FROM aschannels WHERE ID=$1"""
-
-        async with self.bot.db.lock:
-            async with self.bot.db.conn.transaction():
-                sasc = await self.bot.db.conn.fetchrow(
-                    check_aschannel, channel.id
-                )
+        config = await self.bot.db.config_cache.get(guild.id)
+        sasc = config['aschannels'].get(channel.id)
 
         if sasc is None or sasc['locked']:
             return False
@@ -111,12 +102,7 @@ class AutoStarChannels(commands.Cog):
         elif not valid:
             return True
 
-        async with self.bot.db.lock:
-            async with conn.transaction():
-                s_emojis = await conn.fetch(
-                    get_emojis, channel.id
-                )
-
+        s_emojis = config['asemojis'][channel.id]
         asemojis = await converted_emojis(s_emojis, guild)
 
         for e in asemojis:
@@ -147,13 +133,11 @@ class AutoStarChannels(commands.Cog):
         get_asemojis = \
             """SELECT * FROM asemojis WHERE aschannel_id=$1"""
 
-        conn = self.bot.db.conn
-
         if aschannel is None:
             get_aschannels = \
                 """SELECT * FROM aschannels WHERE guild_id=$1"""
 
-            async with self.bot.db.lock:
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     aschannels = await conn.fetch(
                         get_aschannels, ctx.guild.id
@@ -166,7 +150,7 @@ class AutoStarChannels(commands.Cog):
             message = ""
             for asc in aschannels:
                 channel = self.bot.get_channel(asc['id'])
-                async with self.bot.db.lock:
+                async with self.bot.db.acquire() as conn:
                     async with conn.transaction():
                         s_emojis = await conn.fetch(
                             get_asemojis, asc['id']
@@ -190,8 +174,7 @@ class AutoStarChannels(commands.Cog):
             get_aschannel = \
                 """SELECT * FROM aschannels WHERE id=$1"""
 
-            async with self.bot.db.lock:
-                conn = self.bot.db.conn
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     sasc = await conn.fetchrow(
                         get_aschannel, aschannel.id
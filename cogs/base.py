@@ -317,7 +317,9 @@ class Base(commands.Cog):
                 )
             except Exception:
                 pass
-        else:
+        elif functions.matches_prefix(self.bot, message) is not False:
+            # Messages that can't be commands are dropped here, before
+            # discord.py has to build a context for them
             await self.bot.process_commands(message)
 
     @commands.Cog.listener()
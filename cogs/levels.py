@@ -1,9 +1,12 @@
+import asyncio
+import traceback
+from bisect import bisect_left, insort
+from collections import OrderedDict
 from math import sqrt
-from typing import List, Optional, Union
+from typing import List, Optional, Set, Tuple, Union
 
 import discord
-from discord import utils
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 import bot_config
 import cooldowns
@@ -18,6 +21,70 @@ recv_cooldown = cooldowns.CooldownMapping.from_cooldown(
     3, 60
 )
 
+# How many pages of the leaderboard can be flipped through at once
+LEADERBOARD_PAGES = 10
+
+
+class Leaderboard:
+    """The members of a guild that have xp, highest first.
+
+    Members are kept in a sorted list of (-xp, user_id) keys,
+    so a member's rank is a binary search away.
+    """
+    def __init__(
+        self,
+        rows: List[dict]
+    ) -> None:
+        self._members = {
+            int(r['user_id']): (r['xp'], r['lvl']) for r in rows
+        }
+        self._keys = sorted(
+            (-xp, uid) for uid, (xp, _) in self._members.items()
+        )
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(
+        self,
+        user_id: int,
+        xp: int,
+        lvl: int
+    ) -> None:
+        old = self._members.pop(user_id, None)
+        if old is not None:
+            index = bisect_left(self._keys, (-old[0], user_id))
+            del self._keys[index]
+        if xp != 0:
+            self._members[user_id] = (xp, lvl)
+            insort(self._keys, (-xp, user_id))
+
+    def rank(
+        self,
+        user_id: int
+    ) -> Optional[int]:
+        member = self._members.get(user_id)
+        if member is None:
+            return None
+        return bisect_left(self._keys, (-member[0], user_id))
+
+    def page(
+        self,
+        start: int,
+        size: int
+    ) -> List[Tuple[int, int, int]]:
+        """Returns (user_id, xp, lvl) for the members ranked
+        from start (0-indexed) to start+size"""
+        return [
+            (uid, -neg_xp, self._members[uid][1])
+            for neg_xp, uid in self._keys[start:start+size]
+        ]
+
+
+# {guild_id: Leaderboard}, loaded when first needed and kept for
+# the LEADERBOARD_CACHE_SIZE most recently viewed guilds
+leaderboards: 'OrderedDict[int, Leaderboard]' = OrderedDict()
+
 
 async def next_level_xp(
     current_level: int
@@ -32,6 +99,97 @@ async def current_level(
     return int(sqrt(xp))
 
 
+# Flushes started by cog_unload, kept so shutdown can wait for them
+unload_flushes: Set[asyncio.Task] = set()
+
+
+def _unload_flush_done(
+    task: asyncio.Task
+) -> None:
+    unload_flushes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        e = task.exception()
+        traceback.print_exception(type(e), e, e.__traceback__)
+
+
+def pending_member(
+    bot: commands.Bot,
+    guild_id: int,
+    user_id: int
+) -> dict:
+    return bot.db.pending_xp.setdefault(
+        (guild_id, user_id), {'given': 0, 'received': 0, 'xp': 0}
+    )
+
+
+async def flush_xp(
+    bot: commands.Bot,
+    guild_id: Optional[int] = None
+) -> None:
+    """Writes the buffered given, received and xp changes
+    to the members table in a single statement. Only writes
+    the changes of one guild if guild_id is passed."""
+    update_members = \
+        """UPDATE members
+        SET given=GREATEST(members.given+d.given, 0),
+        received=GREATEST(members.received+d.received, 0),
+        xp=GREATEST(members.xp+d.xp, 0),
+        lvl=GREATEST(
+            members.lvl, floor(sqrt(GREATEST(members.xp+d.xp, 0)))
+        )
+        FROM unnest(
+            $1::numeric[], $2::numeric[],
+            $3::int[], $4::int[], $5::int[]
+        ) AS d(guild_id, user_id, given, received, xp), users
+        WHERE members.guild_id=d.guild_id
+        AND members.user_id=d.user_id
+        AND users.id=members.user_id
+        RETURNING members.guild_id, members.user_id,
+        members.xp, members.lvl, users.is_bot"""
+
+    pending = bot.db.pending_xp
+    if guild_id is not None:
+        pending = {
+            key: pending.pop(key) for key in list(pending)
+            if key[0] == guild_id
+        }
+    else:
+        bot.db.pending_xp = {}
+    if pending == {}:
+        return
+
+    keys = list(pending)
+    try:
+        async with bot.db.acquire() as conn:
+            async with conn.transaction():
+                updated = await conn.fetch(
+                    update_members,
+                    [k[0] for k in keys], [k[1] for k in keys],
+                    [pending[k]['given'] for k in keys],
+                    [pending[k]['received'] for k in keys],
+                    [pending[k]['xp'] for k in keys]
+                )
+    except Exception:
+        # Put the changes back so they are retried on the next flush
+        for key, changes in pending.items():
+            member = pending_member(bot, *key)
+            for name, value in changes.items():
+                member[name] += value
+        raise
+
+    for member in updated:
+        if member['is_bot']:
+            continue
+        lb = leaderboards.get(int(member['guild_id']))
+        if lb is not None:
+            lb.update(int(member['user_id']), member['xp'], member['lvl'])
+
+    for (guild_id, user_id), changes in pending.items():
+        if changes['xp'] != 0:
+            bot.dispatch('xpr_needs_update', guild_id, user_id)
+            bot.dispatch('posrole_update', guild_id, user_id)
+
+
 async def handle_reaction(
     bot: commands.Bot,
     reacter_id: int,
@@ -59,63 +217,17 @@ async def handle_reaction(
     if retry_after:
         cooldown_over = False
 
-    get_member = \
-        """SELECT * FROM members WHERE user_id=$1 AND guild_id=$2"""
-    # get_user = \
-    #    """SELECT * FROM users WHERE id=$1"""
-    set_points = \
-        """UPDATE members
-        SET {}=$1
-        WHERE user_id=$2 AND guild_id=$3"""
-    set_xp_level = \
-        """UPDATE members
-        SET xp=$1,
-        lvl=$2
-        WHERE user_id=$3 AND guild_id=$4"""
-
     points = 1 if is_add is True else -1
 
-    # leveled_up = False
-
-    async with bot.db.lock:
-        conn = await bot.db.connect()
-        async with conn.transaction():
-            sql_reacter = await conn.fetchrow(get_member, reacter_id, guild_id)
-            given = sql_reacter['given']+points
-            given = 0 if given < 0 else given
-            await conn.execute(
-                set_points.format('given'), given, reacter_id, guild_id
-            )
-
-            sql_receiver = await conn.fetchrow(
-                get_member, receiver_id, guild_id
-            )
-            received = sql_receiver['received']+points
-            received = 0 if received < 0 else received
-            await conn.execute(
-                set_points.format('received'), received, receiver_id, guild_id
-            )
-
-            # sql_receiver_user = await conn.fetchrow(get_user, receiver_id)
-            # send_lvl_msgs = sql_receiver_user['lvl_up_msgs']
-
-            current_lvl = sql_receiver['lvl']
-            current_xp = sql_receiver['xp']
-            needed_xp = await next_level_xp(current_lvl)
+    # Nothing is written here, the changes are buffered
+    # and written in bulk by flush_xp
+    reacter_changes = pending_member(bot, guild_id, reacter_id)
+    reacter_changes['given'] += points
 
-            new_xp = current_xp + points
-            new_xp = 0 if new_xp < 0 else new_xp
-            new_lvl = current_lvl + 1 if new_xp >= needed_xp else current_lvl
-            # leveled_up = new_lvl > current_lvl if cooldown_over else False
-
-            if cooldown_over:
-                await conn.execute(
-                    set_xp_level, new_xp, new_lvl,
-                    sql_receiver['user_id'], guild_id
-                )
-
-    bot.dispatch('xpr_needs_update', guild.id, receiver.id)
-    bot.dispatch('posrole_update', guild.id, receiver.id)
+    receiver_changes = pending_member(bot, guild_id, receiver_id)
+    receiver_changes['received'] += points
+    if cooldown_over:
+        receiver_changes['xp'] += points
 
     # if leveled_up and send_lvl_msgs:
     #    embed = discord.Embed(
@@ -142,38 +254,31 @@ async def handle_reaction(
 
 async def get_leaderboard(
     bot: commands.Bot,
-    guild: discord.Guild
-) -> List[dict]:
+    guild_id: int
+) -> Leaderboard:
     get_members = \
-        """SELECT * FROM members WHERE xp != 0 AND guild_id=$1
-        ORDER BY xp DESC"""
-
-    async with bot.db.lock:
-        conn = await bot.db.connect()
-        async with conn.transaction():
-            members = await conn.fetch(get_members, guild.id)
+        """SELECT members.user_id, members.xp, members.lvl FROM members
+        JOIN users ON users.id=members.user_id
+        WHERE members.xp != 0 AND members.guild_id=$1
+        AND users.is_bot=False
+        ORDER BY members.xp DESC"""
 
-    ordered = []
-    x = 0
+    await flush_xp(bot, guild_id)
 
-    member_objects = await functions.get_members(
-        [int(m['user_id']) for m in members],
-        guild
-    )
+    lb = leaderboards.get(guild_id)
+    if lb is not None:
+        leaderboards.move_to_end(guild_id)
+        return lb
 
-    for m in members:
-        mobject = utils.get(member_objects, id=m['user_id'])
-        if mobject is None or mobject.bot:
-            continue
-        x += 1
-        username = str(mobject)
-        user_id = mobject.id
-        ordered.append({
-            'name': username, 'user_id': user_id,
-            'index': x, 'd': m
-        })
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            members = await conn.fetch(get_members, guild_id)
 
-    return ordered
+    lb = Leaderboard(members)
+    leaderboards[guild_id] = lb
+    while len(leaderboards) > bot_config.LEADERBOARD_CACHE_SIZE:
+        leaderboards.popitem(last=False)
+    return lb
 
 
 async def get_rank(
@@ -181,13 +286,8 @@ async def get_rank(
     user_id: int,
     guild: discord.Guild
 ) -> Optional[int]:
-    lb = await get_leaderboard(bot, guild)
-    rank = None
-    for i, dict in enumerate(lb):
-        if dict['user_id'] == user_id:
-            rank = i
-            break
-    return rank
+    lb = await get_leaderboard(bot, guild.id)
+    return lb.rank(user_id)
 
 
 class Levels(commands.Cog):
@@ -199,6 +299,22 @@ class Levels(commands.Cog):
     ) -> None:
         self.bot = bot
         self.db = db
+        self.flush_xp_loop.start()
+
+    def cog_unload(self) -> None:
+        self.flush_xp_loop.cancel()
+        task = self.bot.loop.create_task(flush_xp(self.bot))
+        unload_flushes.add(task)
+        task.add_done_callback(_unload_flush_done)
+
+    @tasks.loop(seconds=bot_config.XP_FLUSH_SECONDS)
+    async def flush_xp_loop(self) -> None:
+        # flush_xp puts the changes back when it fails, so the
+        # loop keeps going and they are retried on the next run
+        try:
+            await flush_xp(self.bot)
+        except Exception:
+            traceback.print_exc()
 
     @commands.command(
         name='setxp', aliases=['setlvl'],
@@ -231,9 +347,9 @@ class Levels(commands.Cog):
             guild_id=ctx.guild.id, user=user,
             do_member=True, user_is_id=True
         )
+        await flush_xp(self.bot, ctx.guild.id)
 
-        conn = self.bot.db.conn
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_member = await conn.fetchrow(
                     get_member, user, ctx.guild.id
@@ -245,12 +361,13 @@ class Levels(commands.Cog):
 
         level = await current_level(xp)
 
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 await conn.execute(
                     update_member, xp, level,
                     sql_member['id']
                 )
+        leaderboards.pop(ctx.guild.id, None)
 
         await ctx.send(
             f"Set **{username}**'s XP to {xp} and level to {level}."
@@ -289,9 +406,9 @@ class Levels(commands.Cog):
             guild_id=ctx.guild.id, user=user,
             do_member=True, user_is_id=True
         )
+        await flush_xp(self.bot, ctx.guild.id)
 
-        conn = self.bot.db.conn
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_member = await conn.fetchrow(
                     get_member, user, ctx.guild.id
@@ -305,12 +422,13 @@ class Levels(commands.Cog):
 
         level = await current_level(xp)
 
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 await conn.execute(
                     update_member, xp, level,
                     sql_member['id']
                 )
+        leaderboards.pop(ctx.guild.id, None)
 
         await ctx.send(
             f"Gave **{username}** XP, which made their XP {xp} "
@@ -338,9 +456,9 @@ class Levels(commands.Cog):
             self.bot, guild_id=ctx.guild.id,
             user=user, do_member=True
         )
+        await flush_xp(self.bot, ctx.guild.id)
 
-        async with self.db.lock:
-            conn = await self.db.connect()
+        async with self.db.acquire() as conn:
             async with conn.transaction():
                 sql_member = await conn.fetchrow(
                     get_member, user.id, ctx.guild.id
@@ -371,23 +489,46 @@ class Levels(commands.Cog):
 
     @commands.command(
         name='leaderboard', aliases=['lb', 'levels'],
-        description='View users in order of their XP',
+        description='View users in order of their XP; '
+        'sb!leaderboard [page]',
         brief='View leaderboard'
     )
     @commands.guild_only()
     async def show_leaderboard(
         self,
-        ctx: commands.Context
+        ctx: commands.Context,
+        page: int = 1
     ) -> None:
-        ordered = await get_leaderboard(self.bot, ctx.guild)
+        size = 5
+        lb = await get_leaderboard(self.bot, ctx.guild.id)
+
+        # Only the pages that can be flipped through from here
+        # are built, so only those members have to be resolved
+        # Members that left the server are skipped, and more
+        # are resolved in their place until the pages are full
+        start = max(page - 1, 0) * size
+        wanted = size*LEADERBOARD_PAGES
+        ordered = []
+        position = start
+        while len(ordered) < wanted and position < len(lb):
+            chunk = lb.page(position, wanted - len(ordered))
+            member_objects = await functions.get_members(
+                [uid for uid, _, _ in chunk], ctx.guild
+            )
+            names = {m.id: str(m) for m in member_objects}
+            ordered += [
+                (position + x, names[uid], xp, lvl)
+                for x, (uid, xp, lvl) in enumerate(chunk) if uid in names
+            ]
+            position += len(chunk)
 
         stringed = [
-            f"#{m['index']}. __**{m['name']}**__:\n"
-            f"Level {m['d']['lvl']} | "
-            f"XP {m['d']['xp']}\n\n"
-            for m in ordered
+            f"#{index + 1}. "
+            f"__**{name}**__:\n"
+            f"Level {lvl} | "
+            f"XP {xp}\n\n"
+            for index, name, xp, lvl in ordered
         ]
-        size = 5
         grouped = [stringed[i:i+size] for i in range(0, len(stringed), size)]
 
         embeds = []
@@ -407,7 +548,13 @@ class Levels(commands.Cog):
             embeds.append(embed)
 
         if len(embeds) == 0:
-            await ctx.send("There isn't anyone on the leaderboard yet.")
+            if len(lb) == 0:
+                await ctx.send("There isn't anyone on the leaderboard yet.")
+            else:
+                await ctx.send(
+                    "The leaderboard only has "
+                    f"{(len(lb) - 1)//size + 1} pages."
+                )
             return
 
         paginator = disputils.BotEmbedPaginator(ctx, embeds)
@@ -430,10 +577,11 @@ class Levels(commands.Cog):
             lvl=0
             WHERE user_id=$1 AND guild_id=$2"""
 
-        async with self.db.lock:
-            conn = await self.db.connect()
+        await flush_xp(self.bot, ctx.guild.id)
+        async with self.db.acquire() as conn:
             async with conn.transaction():
                 await conn.execute(set_points, user.id, ctx.guild.id)
+        leaderboards.pop(ctx.guild.id, None)
 
         await ctx.send(f"Reset {user.name}'s levels and xp.")
 
@@ -461,11 +609,12 @@ class Levels(commands.Cog):
         )
         if c.confirmed:
             await c.quit("Resetting the leaderboard, please wait...")
-            conn = self.bot.db.conn
             async with ctx.typing():
-                async with self.bot.db.lock:
+                await flush_xp(self.bot, ctx.guild.id)
+                async with self.bot.db.acquire() as conn:
                     async with conn.transaction():
                         await conn.execute(update_members, ctx.guild.id)
+                leaderboards.pop(ctx.guild.id, None)
             await ctx.send("Finished!")
         else:
             await c.quit("Leaderboard reset cancelled.")
@@ -9,8 +9,9 @@ from discord.ext import commands, tasks
 import bot_config
 import checks
 import functions
+from api.client import client as http_client
 from cogs.stats import post_all
-from database.database import Database
+from database.database import Database, sql_percentile
 from paginators import disputils
 
 
@@ -39,8 +40,8 @@ class Owner(commands.Cog):
 
     @tasks.loop(minutes=5)
     async def dump_sqlruntimes(self) -> None:
-        async with self.bot.db.lock:
-            await self.bot.db.conn.dump()
+        async with self.bot.db.acquire() as conn:
+            await conn.dump()
 
     def insert_returns(
         self,
@@ -125,8 +126,9 @@ class Owner(commands.Cog):
         self,
         ctx: commands.Context
     ) -> None:
-        cache = self.bot.db.cache
-        cache._messages = {}
+        self.bot.db.cache.clear()
+        self.bot.db.config_cache.clear()
+        functions.prefix_cache.clear()
         await ctx.send("Cleared message cache for all servers.")
 
     @commands.command(
@@ -164,11 +166,10 @@ class Owner(commands.Cog):
         if ctx.author.id in bot_config.RUN_SQL:
             result = "None"
             times = 1
-            conn = self.bot.db.conn
             runtimes = []
 
             try:
-                async with self.bot.db.lock:
+                async with self.bot.db.acquire() as conn:
                     async with conn.transaction():
                         for a in args:
                             a = ''.join(a)
@@ -198,10 +199,10 @@ class Owner(commands.Cog):
         ctx: commands.Context,
         sort: str = 'total'
     ) -> None:
-        if sort not in ['avg', 'total', 'count']:
+        if sort not in ['avg', 'total', 'count', 'p50', 'p95', 'p99']:
             await ctx.send(
-                "Valid option are: 'avg', 'total', 'count'."
-                "\nDefaults to total."
+                "Valid option are: 'avg', 'total', 'count', "
+                "'p50', 'p95', 'p99'.\nDefaults to total."
             )
             return
         if ctx.message.author.id not in bot_config.RUN_SQL:
@@ -214,23 +215,35 @@ class Owner(commands.Cog):
                 return float(li[2])/li[1]
             elif sort == 'total':
                 return float(li[2])
-            return li[1]
+            elif sort == 'count':
+                return li[1]
+            return li[3][sort]
 
-        conn = self.bot.db.conn
-        async with self.bot.db.lock:
-            async with self.bot.db.conn.transaction():
+        async with self.bot.db.acquire() as conn:
+            async with conn.transaction():
                 r = await conn.fetch(get_results)
-                sorted_rows = sorted(
-                    [(d['sql'], d['count'], d['time']) for d in r],
-                    key=sorter, reverse=True
-                )
+                rows = []
+                for d in r:
+                    hist = d['hist'] or []
+                    percentiles = {
+                        'p50': sql_percentile(hist, 0.50),
+                        'p95': sql_percentile(hist, 0.95),
+                        'p99': sql_percentile(hist, 0.99)
+                    }
+                    rows.append(
+                        (d['sql'], d['count'], d['time'], percentiles)
+                    )
+                sorted_rows = sorted(rows, key=sorter, reverse=True)
 
         p = commands.Paginator(prefix='', suffix='', max_size=1000)
         embeds = []
         for sr in sorted_rows:
             p.add_line(
                 f"```{sr[0]}```**{sr[1]} | {round(sr[2], 5)} seconds "
-                f"| {ms(sr[2]/sr[1])} ms**"
+                f"| {ms(sr[2]/sr[1])} ms**\n"
+                f"p50 < {ms(sr[3]['p50'])} ms | "
+                f"p95 < {ms(sr[3]['p95'])} ms | "
+                f"p99 < {ms(sr[3]['p99'])} ms"
             )
 
         for page in p.pages:
@@ -253,9 +266,9 @@ class Owner(commands.Cog):
         delete = \
             """DELETE FROM sqlruntimes"""
 
-        async with self.bot.db.lock:
-            async with self.bot.db.conn.transaction():
-                await self.bot.db.conn.execute(delete)
+        async with self.bot.db.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(delete)
 
         await ctx.send("Done")
 
@@ -266,11 +279,64 @@ class Owner(commands.Cog):
     ) -> None:
         if ctx.message.author.id not in bot_config.RUN_SQL:
             return
-        async with self.bot.db.lock:
-            await self.bot.db.conn.dump()
+        async with self.bot.db.acquire() as conn:
+            await conn.dump()
 
         await ctx.send("Done")
 
+    @commands.command(name='reactionstats')
+    async def get_reaction_stats(
+        self,
+        ctx: commands.Context
+    ) -> None:
+        if ctx.message.author.id not in bot_config.RUN_SQL:
+            return
+        starboard = self.bot.get_cog('Starboard')
+        stats = starboard.reaction_stats
+
+        await ctx.send(
+            f"**received:** {stats['received']}\n"
+            f"**merged:** {stats['merged']}\n"
+            f"**processed:** {stats['processed']}\n"
+            f"**flushes:** {stats['flushes']}\n"
+            f"**pending messages:** {len(starboard.pending_reactions)}"
+        )
+
+    @commands.command(name='cachestats')
+    async def get_cache_stats(
+        self,
+        ctx: commands.Context
+    ) -> None:
+        if ctx.message.author.id not in bot_config.RUN_SQL:
+            return
+        stats = self.bot.db.cache.stats()
+        stats['embed_hits'] = functions.embed_cache_stats['hits']
+        stats['embed_misses'] = functions.embed_cache_stats['misses']
+        stats['embeds'] = len(functions.embed_cache)
+        stats['embed_bytes'] = functions.embed_cache_stats['bytes']
+
+        await ctx.send('\n'.join(
+            f"**{name}:** {round(value, 3)}" for name, value in stats.items()
+        ))
+
+    @commands.command(name='httpstats')
+    async def get_http_stats(
+        self,
+        ctx: commands.Context
+    ) -> None:
+        if ctx.message.author.id not in bot_config.RUN_SQL:
+            return
+        lines = []
+        for host, stats in http_client.stats.items():
+            lines.append(
+                f"**{host}:** {stats['requests']} requests | "
+                f"{stats['errors']} errors | {stats['retries']} retries | "
+                f"avg {ms(stats['time']/stats['requests'])} ms | "
+                f"max {ms(stats['max'])} ms"
+            )
+
+        await ctx.send('\n'.join(lines) or "No requests made yet.")
+
     @commands.command(name='ownerclean')
     @commands.is_owner()
     async def clean_database(
@@ -279,8 +345,6 @@ class Owner(commands.Cog):
     ) -> None:
         """Cleans several different things from the database"""
 
-        conn = self.bot.db.conn
-
         # Remove starboard messages of starboards that were deleted
         get_starboards = \
             """SELECT * FROM starboards"""
@@ -290,13 +354,14 @@ class Owner(commands.Cog):
             AND is_orig=False"""
 
         await ctx.send("Removing messages...")
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 starboards = await conn.fetch(
                     get_starboards
                 )
                 sids = [s['id'] for s in starboards]
                 await conn.execute(clean_sb_messages, sids)
+        self.bot.db.message_rows.clear()
 
         await ctx.send("Finished cleaning")
 
@@ -1,4 +1,5 @@
-from typing import Tuple, Optional, List
+import traceback
+from typing import List, Set
 
 import discord
 from discord.ext import commands, tasks
@@ -12,8 +13,7 @@ async def is_xpr(
     bot: commands.Bot,
     role_id: int
 ) -> bool:
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             exists = await conn.fetchrow(
                 """SELECT * FROM xproles
@@ -22,102 +22,113 @@ async def is_xpr(
     return exists
 
 
-async def get_role_by_xp(
+async def get_top_members(
     bot: commands.Bot,
     guild: discord.Guild,
-    xp: int,
-    _current_roles: List[discord.Role]
-) -> Tuple[
-    Optional[dict], Optional[discord.Role],
-    Optional[dict], List[discord.Role]
-]:
-    current_roles = [r.id for r in _current_roles]
-    get_lowest_xp = \
-        """SELECT * FROM members
-        WHERE guild_id=$1
-        AND user_id=ANY($2::numeric[])
-        ORDER BY xp ASC
-        LIMIT 1"""
-
-    conn = bot.db.conn
-
-    roles_sql = await get_pos_roles(
-        bot, guild.id
-    )
-    role_objects = [
-        discord.utils.get(guild.roles, id=int(r['id']))
-        for r in roles_sql
-    ]
-
-    role: discord.Role
-    for x, role in enumerate(role_objects):
-        if roles_sql[x]['max_users'] is None:
-            role_objects.remove(role)
-            return roles_sql[x], role, None, role_objects
-
-        user_count = len(role.members) if role.id not in current_roles\
-            else len(role.members) - 1
-
-        if user_count < roles_sql[x]['max_users']:
-            role_objects.remove(role)
-            return roles_sql[x], role, None, role_objects
-
-        mids = [m.id for m in role.members]
-        async with bot.db.lock:
+    limit: int
+) -> List[discord.Member]:
+    """Returns up to `limit` members with the most XP, in order,
+    skipping anyone who has left the guild"""
+    get_top = \
+        """SELECT members.user_id FROM members
+        JOIN users ON users.id=members.user_id
+        WHERE members.xp != 0 AND members.guild_id=$1
+        AND users.is_bot=False
+        ORDER BY members.xp DESC
+        LIMIT $2 OFFSET $3"""
+
+    top = []
+    offset = 0
+    while len(top) < limit:
+        async with bot.db.acquire() as conn:
             async with conn.transaction():
-                sql_lowest_member = await conn.fetchrow(
-                    get_lowest_xp, guild.id, mids
-                )
+                rows = await conn.fetch(get_top, guild.id, limit, offset)
+        offset += limit
 
-        _members = await functions.get_members(
-            [int(sql_lowest_member['user_id'])], guild
-        )
-        if _members == []:
-            replace_member = None
-        else:
-            replace_member = _members[0]
+        found = {
+            m.id: m for m in await functions.get_members(
+                [r['user_id'] for r in rows], guild
+            )
+        }
+        for r in rows:
+            member = found.get(int(r['user_id']))
+            if member is not None:
+                top.append(member)
 
-        if sql_lowest_member['xp'] < xp:
-            role_objects.remove(role)
-            return roles_sql[x], role, replace_member, role_objects
+        if len(rows) < limit:
+            break
 
-    return None, None, None, []
+    return top[:limit]
 
 
-async def update_user_roles(
+async def update_guild_roles(
     bot: commands.Bot,
     guild: discord.Guild,
-    member: discord.Member
-) -> None:
-    get_member = \
-        """SELECT * FROM members
-        WHERE guild_id=$1
-        AND user_id=$2"""
-
-    conn = bot.db.conn
-
-    async with bot.db.lock:
-        async with conn.transaction():
-            sql_member = await conn.fetchrow(
-                get_member, guild.id, member.id
-            )
-
-    sql_role, role_obj, replace_member, _remove_roles = await get_role_by_xp(
-        bot, guild, sql_member['xp'], member.roles
+    member_ids: Set[int]
+) -> int:
+    """Gives each Position Role to the members ranked for it and
+    takes it from everyone else. member_ids are members whose XP
+    changed, so they are checked even if the role cache is stale.
+    Returns the number of members that were edited."""
+    roles = []
+    for r in await get_pos_roles(bot, guild.id):
+        role = guild.get_role(int(r['id']))
+        if role is not None:
+            roles.append((role, r['max_users']))
+    if roles == []:
+        return 0
+
+    top = await get_top_members(
+        bot, guild, sum(max_users for _, max_users in roles)
     )
 
-    remove_roles = []
-    for r in _remove_roles:
-        if await functions.can_manage_role(bot, r):
-            remove_roles.append(r)
-
-    if not sql_role:
-        return
-
-    await member.add_roles(role_obj)
-    await member.remove_roles(*remove_roles)
-    if replace_member:
-        bot.dispatch('posrole_update', guild.id, replace_member.id)
+    # Roles are ordered by max_users, so the highest ranked
+    # members get the most exclusive role
+    wanted = {}
+    start = 0
+    for role, max_users in roles:
+        for member in top[start:start+max_users]:
+            wanted[member.id] = role
+        start += max_users
+
+    members = {m.id: m for m in top}
+    for role, _ in roles:
+        for member in role.members:
+            members[member.id] = member
+    unseen = [mid for mid in member_ids if int(mid) not in members]
+    for member in await functions.get_members(unseen, guild):
+        members[member.id] = member
+
+    manageable = set()
+    for role, _ in roles:
+        if await functions.can_manage_role(bot, role):
+            manageable.add(role.id)
+
+    # Only the Position Roles that changed are added or removed, so
+    # other role changes made in the meantime are left alone
+    edited = 0
+    for member in members.values():
+        role = wanted.get(member.id)
+        to_add = []
+        if role is not None and role.id in manageable\
+                and role not in member.roles:
+            to_add.append(role)
+        to_remove = [
+            r for r in member.roles
+            if r.id in manageable and r != role
+        ]
+        if to_add == [] and to_remove == []:
+            continue
+        try:
+            if to_add != []:
+                await member.add_roles(*to_add)
+            if to_remove != []:
+                await member.remove_roles(*to_remove)
+        except discord.HTTPException:
+            continue
+        edited += 1
+
+    return edited
 
 
 async def get_pos_roles(
@@ -129,9 +140,7 @@ async def get_pos_roles(
         WHERE guild_id=$1
         ORDER BY max_users ASC"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             pos_roles = await conn.fetch(
                 fetch_roles, guild_id
@@ -168,9 +177,7 @@ async def add_pos_role(
             "last page of `sb!tutorial` for more info."
         )
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             current_num = await conn.fetchval(
                 """SELECT COUNT (*) FROM posroles
@@ -188,7 +195,7 @@ async def add_pos_role(
             "a Position Role."
         )
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 add_role, role.id, role.guild.id,
@@ -204,9 +211,7 @@ async def remove_pos_role(
         """DELETE FROM posroles
         WHERE id=$1"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 del_role, role_id
@@ -223,9 +228,7 @@ async def set_role_users(
         SET max_users=$1
         WHERE id=$2"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 update_role, max_users, role_id
@@ -240,32 +243,41 @@ class PositionRoles(commands.Cog):
         bot: commands.Bot
     ) -> None:
         self.bot = bot
-        self.queue = {}
+        # {guild_id: {ids of members whose xp changed}}, in the
+        # order the guilds were first marked
+        self.dirty = {}
+        self.stats = {'queued': 0, 'recomputes': 0, 'edits': 0}
         self.update_some_roles.start()
 
+    def cog_unload(self) -> None:
+        self.update_some_roles.cancel()
+
     @commands.Cog.listener()
     async def on_posrole_update(
         self,
         guild_id: int,
         member_id: int
     ) -> None:
-        self.queue.setdefault(guild_id, [])
-        self.queue[guild_id].append(member_id)
-
-    @tasks.loop(seconds=1)
-    async def update_some_roles(self):
-        queue = self.queue.copy()
-        for guild_id in queue:
-            mids = queue[guild_id]
-            if len(mids) == 0:
-                continue
-            member_id = mids.pop(0)
+        self.dirty.setdefault(int(guild_id), set()).add(int(member_id))
+        self.stats['queued'] += 1
+
+    @tasks.loop(seconds=bot_config.POSROLE_UPDATE_SECONDS)
+    async def update_some_roles(self) -> None:
+        guild_ids = list(self.dirty)[:bot_config.POSROLE_GUILDS_PER_UPDATE]
+        for guild_id in guild_ids:
+            member_ids = self.dirty.pop(guild_id)
             guild = self.bot.get_guild(guild_id)
-            members = await functions.get_members([member_id], guild)
-            if len(members) == 0:
-                return
-            member = members[0]
-            await update_user_roles(self.bot, guild, member)
+            if guild is None:
+                continue
+            try:
+                edited = await update_guild_roles(
+                    self.bot, guild, member_ids
+                )
+            except Exception:
+                traceback.print_exc()
+                continue
+            self.stats['recomputes'] += 1
+            self.stats['edits'] += edited
 
     @commands.group(
         name='posroles', aliases=['pr', 'proles'],
@@ -310,6 +322,7 @@ class PositionRoles(commands.Cog):
         await add_pos_role(
             self.bot, role, max_users
         )
+        self.dirty.setdefault(ctx.guild.id, set())
         await ctx.send(
             f"**{role.name}** is now a Position-based Award Role."
         )
@@ -347,6 +360,7 @@ class PositionRoles(commands.Cog):
         await set_role_users(
             self.bot, role.id, max_users
         )
+        self.dirty.setdefault(ctx.guild.id, set())
         await ctx.send(
             f"Set the max users for **{role.name}** to "
             f"**{max_users}**."
@@ -4,7 +4,6 @@ import os
 
 import discord
 import humanize
-from aiohttp_requests import requests
 from discord.ext import commands, tasks
 from patreon.jsonapi.parser import JSONAPIParser
 from patreon.jsonapi.url_util import build_url
@@ -15,6 +14,7 @@ from six.moves.urllib.parse import parse_qs, urlencode, urlparse
 
 import bot_config
 import functions
+from api.client import client
 from paginators import disputils
 
 
@@ -49,7 +49,6 @@ class Premium(commands.Cog):
             for p in all_patrons
             if p['discord_id'] is not None
         ]
-        conn = self.bot.db.conn
         for patron in all_patrons:
             if patron['discord_id'] is None:
                 await functions.alert_owner(
@@ -63,13 +62,13 @@ class Premium(commands.Cog):
             await functions.check_or_create_existence(
                 self.bot, user=user
             )
-            async with self.bot.db.lock:
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     suser = await conn.fetchrow(
                         get_user, patron['discord_id']
                     )
             if suser['payment'] != patron['payment']:
-                async with self.bot.db.lock:
+                async with self.bot.db.acquire() as conn:
                     async with conn.transaction():
                         await conn.execute(
                             update_user, patron['payment'],
@@ -111,7 +110,7 @@ class Premium(commands.Cog):
 
         # Check any removed patrons
         removed = []
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_all_patrons = await conn.fetch(
                     get_sql_patrons
@@ -141,9 +140,8 @@ class Premium(commands.Cog):
         create_payroll = \
             """INSERT INTO payrolls VALUES ($1)"""
 
-        conn = self.bot.db.conn
         now = datetime.datetime.now()
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 last_date = await conn.fetchval(
                     get_latest_payroll
@@ -163,8 +161,7 @@ class Premium(commands.Cog):
             SET premium_end=NULL
             WHERE id=$1"""
 
-        conn = self.bot.db.conn
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_prem_guilds = await conn.fetch(
                     get_premium_guilds
@@ -181,7 +178,7 @@ class Premium(commands.Cog):
                 if did_redeem is True:
                     continue
 
-                async with self.bot.db.lock:
+                async with self.bot.db.acquire() as conn:
                     async with conn.transaction():
                         await conn.execute(
                             expire_prem, sg['id']
@@ -423,10 +420,9 @@ class Premium(commands.Cog):
         run it in DMs, it will list all servers that
         autoredeem is on for.
         """
-        conn = self.bot.db.conn
 
         if ctx.guild is None:  # used in DMs
-            async with self.bot.db.lock:
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     ar_members = await conn.fetch(
                         """SELECT * FROM members
@@ -450,7 +446,7 @@ class Premium(commands.Cog):
                     "You have not enabled AutoRedeem on any servers."
                 )
         else:
-            async with self.bot.db.lock:
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     is_on = await conn.fetchval(
                         """SELECT autoredeem FROM members
@@ -473,9 +469,8 @@ class Premium(commands.Cog):
         """Enables AutoRedeem on the current server, so the next
         time it is out of premium it will automatically
         redeem credits from your account."""
-        conn = self.bot.db.conn
 
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 already_on = await conn.fetchrow(
                     """SELECT * FROM members
@@ -514,7 +509,7 @@ class Premium(commands.Cog):
             await c.quit("Cancelled")
             return
 
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 await conn.execute(
                     """UPDATE members
@@ -551,9 +546,7 @@ class Premium(commands.Cog):
 
         guild = ctx.guild or self.bot.get_guild(guild_id)
 
-        conn = self.bot.db.conn
-
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 await conn.execute(
                     """UPDATE members
@@ -650,7 +643,7 @@ class API(object):
         return JSONAPIParser(response_json)
 
     async def __get_json(self, suffix):
-        response = await requests.get(
+        response = await client.get(
             "https://www.patreon.com/api/oauth2/api/{}".format(suffix),
             headers={
                 'Authorization': "Bearer {}".format(self.access_token),
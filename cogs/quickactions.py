@@ -25,9 +25,7 @@ async def is_qa_on(
         """SELECT is_qa_on FROM guilds
         WHERE id=$1"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             is_on = await conn.fetchval(
                 get_val, guild_id
@@ -40,14 +38,10 @@ async def is_orig(
     bot: commands.Bot,
     mid: int
 ) -> bool:
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
-            is_orig: bool = await conn.fetchval(
-                """SELECT is_orig FROM messages
-                WHERE id=$1""", mid
-            )
-    return is_orig if is_orig is not None else True
+            sql_message = await bot.db.message_rows.fetch(conn, mid)
+    return sql_message['is_orig'] if sql_message is not None else True
 
 
 async def toggle_setting(
@@ -57,9 +51,6 @@ async def toggle_setting(
     guild_id: int,
     setting: str
 ) -> None:
-    get_message = \
-        """SELECT * FROM messages
-        WHERE id=$1"""
     update_trashed = \
         """UPDATE messages
         SET is_trashed=$1
@@ -77,31 +68,36 @@ async def toggle_setting(
     if guild is None:
         return
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
-        async with bot.db.conn.transaction():
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
             mid, _cid = await functions.orig_message_id(
                 bot.db, conn, message_id
             )
-            sql_message = await conn.fetchrow(
-                get_message, mid
-            )
+            sql_message = await bot.db.message_rows.fetch(conn, mid)
+            changes = {}
             if setting == 'trash':
                 trash: bool = not sql_message['is_trashed']
                 await conn.execute(
                     update_trashed, trash, mid
                 )
+                changes['is_trashed'] = trash
             elif setting == 'freeze':
                 freeze: bool = not sql_message['is_frozen']
                 await conn.execute(
                     update_frozen, freeze, mid
                 )
+                changes['is_frozen'] = freeze
             elif setting == 'force':
                 force: bool = not sql_message['is_forced']
                 await conn.execute(
                     update_forced, force, mid
                 )
+                changes['is_forced'] = force
+
+    # Only cached once committed, so a rollback can't leave
+    # the cache disagreeing with the table
+    if changes != {}:
+        bot.db.message_rows.update(mid, **changes)
 
     cid = _cid or channel_id
     channel = guild.get_channel(cid)
@@ -199,10 +195,8 @@ class QuickActions(commands.Cog):
             SET is_qa_on=$1
             WHERE id=$2"""
 
-        conn = self.bot.db.conn
-
         if enabled is None:
-            async with self.bot.db.lock:
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     sql_guild = await conn.fetchrow(
                         get_guild, ctx.guild.id
@@ -214,7 +208,7 @@ class QuickActions(commands.Cog):
                 "QuickActions are enabled for this server."
             )
         else:
-            async with self.bot.db.lock:
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     await conn.execute(
                         update_guild, enabled,
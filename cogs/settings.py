@@ -23,9 +23,7 @@ async def get_blacklist_config_embeds(
     get_starboards = \
         """SELECT * FROM starboards WHERE guild_id=$1"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             starboards = await conn.fetch(get_starboards, guild_id)
             rolelist = await conn.fetch(get_rolelist, guild_id)
@@ -123,8 +121,7 @@ async def change_user_setting(
         SET lvl_up_msgs=$1
         WHERE id=$2"""
 
-    async with db.lock:
-        conn = await db.connect()
+    async with db.acquire() as conn:
         async with conn.transaction():
             sql_user = await conn.fetchrow(get_user, user_id)
 
@@ -171,8 +168,7 @@ class Settings(commands.Cog):
             do_member=True if ctx.guild is not None else None
         )
 
-        async with self.db.lock:
-            conn = await self.db.connect()
+        async with self.db.acquire() as conn:
             async with conn.transaction():
                 sql_user = await conn.fetchrow(get_user, ctx.message.author.id)
 
@@ -1,7 +1,12 @@
+import asyncio
+import io
+import json
 import random
-from typing import List, Optional, Union
+import time
+import traceback
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
 
-import asyncpg
 import discord
 from discord import utils
 from discord.ext import commands, flags
@@ -9,6 +14,7 @@ from discord.ext import commands, flags
 import bot_config
 import cooldowns
 import functions
+import metrics
 import settings
 from cogs import levels
 from database.database import Database
@@ -18,6 +24,10 @@ edit_message_cooldown = cooldowns.CooldownMapping.from_cooldown(
     3, 5
 )
 
+# {starboard message id: (content, embed fingerprint)} as of the last
+# send or edit, so that edits which wouldn't change anything are skipped
+rendered = OrderedDict()
+
 
 async def pretty_emoji_string(
     emojis: List[dict],
@@ -47,47 +57,75 @@ class Starboard(commands.Cog):
     ) -> None:
         self.bot = bot
         self.db = db
+        # {message_id: {'guild_id', 'channel_id', 'reactions': {
+        #   (user_id, emoji_name): (emoji, is_add)}}}
+        self.pending_reactions = {}
+        # ids of the messages that have a flush_reactions running
+        self.flushing = set()
+        self.reaction_stats = {
+            'received': 0,
+            'merged': 0,
+            'processed': 0,
+            'flushes': 0
+        }
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(
         self,
         payload: discord.RawReactionActionEvent
     ) -> None:
-        guild_id = payload.guild_id
-        if guild_id is None:
-            return
-        channel_id = payload.channel_id
-        message_id = payload.message_id
-        user_id = payload.user_id
-        emoji = payload.emoji
+        await self.queue_reaction(payload, True)
 
-        emoji_name = str(emoji.id) if emoji.id is not None\
-            else emoji.name
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(
+        self,
+        payload: discord.RawReactionActionEvent
+    ) -> None:
+        await self.queue_reaction(payload, False)
 
-        if not await functions.is_starboard_emoji(
-            self.bot.db, guild_id, emoji_name
-        ):
+    @commands.Cog.listener()
+    async def on_raw_message_delete(
+        self,
+        payload: discord.RawMessageDeleteEvent
+    ) -> None:
+        # A deleted starboard message is forgotten, so that the
+        # original can be sent to the starboard again
+        if payload.guild_id is None:
             return
-
-        await handle_reaction(
-            self.bot.db, self.bot, guild_id, channel_id,
-            user_id, message_id, emoji, True
+        starboard = await self.bot.db.config_cache.get_starboard(
+            payload.guild_id, payload.channel_id
         )
+        if starboard is None:
+            return
+        await forget_starboard_message(self.bot.db, payload.message_id)
 
     @commands.Cog.listener()
-    async def on_raw_reaction_remove(
+    async def on_raw_bulk_message_delete(
         self,
-        payload: discord.RawReactionActionEvent
+        payload: discord.RawBulkMessageDeleteEvent
+    ) -> None:
+        if payload.guild_id is None:
+            return
+        starboard = await self.bot.db.config_cache.get_starboard(
+            payload.guild_id, payload.channel_id
+        )
+        if starboard is None:
+            return
+        for message_id in payload.message_ids:
+            await forget_starboard_message(self.bot.db, message_id)
+
+    async def queue_reaction(
+        self,
+        payload: discord.RawReactionActionEvent,
+        is_add: bool
     ) -> None:
         guild_id = payload.guild_id
         if guild_id is None:
             return
-        channel_id = payload.channel_id
         message_id = payload.message_id
-        user_id = payload.user_id
         emoji = payload.emoji
 
-        emoji_name = emoji.id if emoji.id is not None\
+        emoji_name = str(emoji.id) if emoji.id is not None\
             else emoji.name
 
         if not await functions.is_starboard_emoji(
@@ -95,10 +133,61 @@ class Starboard(commands.Cog):
         ):
             return
 
-        await handle_reaction(
-            self.bot.db, self.bot, guild_id, channel_id,
-            user_id, message_id, emoji, False
-        )
+        self.reaction_stats['received'] += 1
+
+        pending = self.pending_reactions.get(message_id)
+        if pending is None:
+            pending = {
+                'guild_id': guild_id,
+                'channel_id': payload.channel_id,
+                'reactions': {}
+            }
+            self.pending_reactions[message_id] = pending
+            # A running flush picks the new entry up once it's done
+            if message_id not in self.flushing:
+                self.bot.loop.create_task(self.flush_reactions(message_id))
+
+        # A reaction that is added and removed (or removed and
+        # re-added) inside the same window cancels itself out
+        key = (payload.user_id, emoji_name)
+        previous = pending['reactions'].pop(key, None)
+        if previous is not None:
+            self.reaction_stats['merged'] += 1
+            if previous[1] is not is_add:
+                return
+        pending['reactions'][key] = (emoji, is_add)
+
+    async def flush_reactions(
+        self,
+        message_id: int
+    ) -> None:
+        """Handles the pending reactions of a message, one batch at
+        a time, until no more come in while a batch is handled"""
+        self.flushing.add(message_id)
+        try:
+            while message_id in self.pending_reactions:
+                await asyncio.sleep(bot_config.REACTION_BUFFER_SECONDS)
+                pending = self.pending_reactions.pop(message_id)
+                if pending['reactions'] == {}:
+                    continue
+
+                reactions = [
+                    (user_id, emoji, is_add)
+                    for (user_id, _), (emoji, is_add)
+                    in pending['reactions'].items()
+                ]
+                self.reaction_stats['processed'] += len(reactions)
+                self.reaction_stats['flushes'] += 1
+
+                try:
+                    await handle_reactions(
+                        self.db, self.bot, pending['guild_id'],
+                        pending['channel_id'], message_id, reactions
+                    )
+                except Exception:
+                    traceback.print_exc()
+        finally:
+            self.flushing.discard(message_id)
 
     @flags.add_flag('--by', type=discord.User, default=None)
     @flags.add_flag('--stars', type=int, default=None)
@@ -153,8 +242,7 @@ class Starboard(commands.Cog):
             AND ($4::numeric is null or channel_id=$4)
             """
         )
-        conn = self.bot.db.conn
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 m = await conn.fetch(
                     query, ctx.guild.id, uid, stars, sid
@@ -168,7 +256,7 @@ class Starboard(commands.Cog):
             return
         sql_rand_message = random.choice(m)
 
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 orig_mid, orig_cid = await functions.orig_message_id(
                     self.bot.db, conn, int(sql_rand_message['id'])
@@ -218,8 +306,7 @@ class Starboard(commands.Cog):
                 self.bot, guild_id=ctx.guild.id,
                 user=ctx.message.author, do_member=True
             )
-            async with self.db.lock:
-                conn = await self.db.connect()
+            async with self.db.acquire() as conn:
                 async with conn.transaction():
                     rows = await conn.fetch(get_starboards, ctx.guild.id)
 
@@ -259,8 +346,7 @@ class Starboard(commands.Cog):
                 self.bot, guild_id=ctx.guild.id,
                 user=ctx.message.author, do_member=True
             )
-            async with self.db.lock:
-                conn = await self.db.connect()
+            async with self.db.acquire() as conn:
                 async with conn.transaction():
                     sql_starboard = await conn.fetchrow(
                         get_starboard, starboard.id
@@ -564,69 +650,88 @@ class Starboard(commands.Cog):
 
 
 # Functions:
-async def handle_reaction(
+async def handle_reactions(
     db: Database,
     bot: commands.Bot,
     guild_id: int,
     _channel_id: int,
-    user_id: int,
     _message_id: int,
-    _emoji: discord.PartialEmoji,
-    is_add: bool
+    reactions: List[Tuple[int, discord.PartialEmoji, bool]]
 ) -> None:
-    emoji_name = _emoji.name if _emoji.id is None else str(_emoji.id)
-
-    check_reaction = \
-        """SELECT * FROM reactions
-        WHERE message_id=$1
-        AND user_id=$2
-        AND name=$3"""
-    remove_reaction = \
+    add_reactions = \
+        """INSERT INTO reactions (guild_id, user_id, message_id, name)
+        SELECT $1::numeric, r.user_id, $2::numeric, r.name
+        FROM unnest($3::numeric[], $4::text[]) AS r(user_id, name)
+        WHERE EXISTS (SELECT 1 FROM users WHERE id=r.user_id)
+        AND EXISTS (SELECT 1 FROM messages WHERE id=$2)
+        AND NOT EXISTS (
+            SELECT 1 FROM reactions
+            WHERE message_id=$2
+            AND user_id=r.user_id
+            AND name=r.name
+        )"""
+    remove_reactions = \
         """DELETE FROM reactions
         WHERE message_id=$1
-        AND user_id=$2
-        AND name=$3"""
-    get_message = \
-        """SELECT * FROM messages WHERE id=$1"""
-    get_user = \
-        """SELECT * FROM users WHERE id=$1"""
-    get_member = \
-        """SELECT * FROM members WHERE user_id=$1 and guild_id=$2"""
-
-    async with db.lock:
-        conn = await db.connect()
+        AND (user_id, name) IN (
+            SELECT * FROM unnest($2::numeric[], $3::text[])
+        )"""
+    get_users = \
+        """SELECT * FROM users WHERE id=any($1::numeric[])"""
+    get_members = \
+        """SELECT user_id FROM members
+        WHERE user_id=any($1::numeric[]) AND guild_id=$2"""
+
+    user_ids = list({user_id for user_id, _, _ in reactions})
+
+    async with db.acquire() as conn:
         async with conn.transaction():
             message_id, orig_channel_id = await functions.orig_message_id(
                 db, conn, _message_id
             )
-            sql_user = await conn.fetchrow(get_user, user_id)
-            sql_member = await conn.fetchrow(get_member, user_id, guild_id)
+            sql_users = {
+                int(u['id']): u for u in await conn.fetch(get_users, user_ids)
+            }
+            member_ids = {
+                int(m['user_id']) for m in
+                await conn.fetch(get_members, user_ids, guild_id)
+            }
 
     channel_id = orig_channel_id if orig_channel_id is not None \
         else _channel_id
 
     guild = bot.get_guild(guild_id)
     channel = utils.get(guild.channels, id=int(channel_id))
-    # user = utils.get(guild.members, id=user_id)
-
-    user = None
-    if sql_user is None or sql_member is None:
-        _users = await functions.get_members([user_id], guild)
-        if len(_users) == 0:
-            user = None
-        else:
-            user = _users[0]
 
-        await functions.check_or_create_existence(
-            bot, guild_id=guild_id,
-            user=user, do_member=True
-        )
-
-        if user is not None and user.bot:
-            return
-    elif sql_user is not None:
-        if sql_user['is_bot']:
-            return
+    # Users that are real (not bots) and known to the bot,
+    # and whose reactions should therefore be counted
+    humans = {
+        uid for uid, u in sql_users.items()
+        if uid in member_ids and not u['is_bot']
+    }
+    missing_ids = [
+        uid for uid in user_ids
+        if uid not in sql_users or uid not in member_ids
+    ]
+    if missing_ids != []:
+        users = {
+            u.id: u for u in await functions.get_members(missing_ids, guild)
+        }
+        for uid in missing_ids:
+            user = users.get(uid)
+            await functions.check_or_create_existence(
+                bot, guild_id=guild_id,
+                user=user, do_member=True
+            )
+            if user is not None:
+                if not user.bot:
+                    humans.add(uid)
+            elif uid in sql_users and not sql_users[uid]['is_bot']:
+                humans.add(uid)
+
+    reactions = [r for r in reactions if r[0] in humans]
+    if reactions == []:
+        return
 
     try:
         message = await functions.fetch(bot, int(message_id), channel)
@@ -643,45 +748,41 @@ async def handle_reaction(
         guild_id=guild_id
     )
 
-    async with db.lock:
-        conn = await db.connect()
+    added = ([], [])
+    removed = ([], [])
+    for user_id, _emoji, is_add in reactions:
+        emoji_name = _emoji.name if _emoji.id is None else str(_emoji.id)
+        lists = added if is_add else removed
+        lists[0].append(user_id)
+        lists[1].append(emoji_name)
+
+    async with db.acquire() as conn:
         async with conn.transaction():
-            rows = await conn.fetch(get_message, message_id)
+            sql_message = await db.message_rows.fetch(conn, message_id)
+            new_row = None
             if message:
-                if len(rows) == 0:
-                    await db.q.create_message.fetch(
+                if sql_message is None:
+                    new_row = await conn.fetchrow(
+                        db.q.create_message,
                         message_id, guild_id,
                         message.author.id, None,
                         channel_id, True,
                         message.channel.is_nsfw()
                     )
-            try:
-                rows = await conn.fetch(
-                    check_reaction, message_id, user_id, emoji_name
+            if added[0] != []:
+                await conn.execute(
+                    add_reactions, guild_id, message_id, *added
+                )
+            if removed[0] != []:
+                await conn.execute(
+                    remove_reactions, message_id, *removed
                 )
-                exists = len(rows) > 0
-                if not exists and is_add:
-                    await db.q.create_reaction.fetch(
-                        guild_id, user_id,
-                        message_id, emoji_name
-                    )
-                if exists and not is_add:
-                    await conn.execute(
-                        remove_reaction, message_id, user_id, emoji_name
-                    )
-            except asyncpg.exceptions.ForeignKeyViolationError:
-                pass
+
+    if new_row is not None:
+        db.message_rows.put(new_row)
 
     if message is not None:
-        handle_level = False
-        if user is None:
-            if sql_user is not None:
-                if not sql_user['is_bot']:
-                    handle_level = True
-        elif not user.bot:
-            handle_level = True
-
-        if handle_level:
+        for user_id, _emoji, is_add in reactions:
             await levels.handle_reaction(
                 bot, user_id, message.author, guild, _emoji, is_add
             )
@@ -697,22 +798,15 @@ async def handle_starboards(
     message: Optional[discord.Message],
     guild: discord.Guild
 ) -> None:
-    get_message = \
-        """SELECT * FROM messages WHERE id=$1"""
-    get_starboards = \
-        """SELECT * FROM starboards
-        WHERE guild_id=$1
-        AND locked=False"""
-
-    sql_starboards = []
+    get_author = \
+        """SELECT * FROM users WHERE id=$1"""
 
-    async with db.lock:
-        conn = await db.connect()
+    async with db.acquire() as conn:
         async with conn.transaction():
-            sql_message = await conn.fetchrow(get_message, message_id)
+            sql_message = await db.message_rows.fetch(conn, message_id)
             if sql_message is not None:
-                sql_starboards = await conn.fetch(
-                    get_starboards, sql_message['guild_id']
+                sql_author = await conn.fetchrow(
+                    get_author, sql_message['user_id']
                 )
 
     b = edit_message_cooldown.get_bucket(message_id)
@@ -721,12 +815,40 @@ async def handle_starboards(
     if retry_after:
         on_cooldown = True
 
-    if sql_message is not None:
-        for sql_starboard in sql_starboards:
+    if sql_message is None:
+        return
+
+    config = await db.config_cache.get(int(sql_message['guild_id']))
+    sql_starboards = [
+        s for s in config['starboards'].values() if not s['locked']
+    ]
+    if sql_starboards == []:
+        return
+
+    # Everything that doesn't depend on the starboard is only
+    # looked up or built once, and shared by all of them
+    reactions = await functions.get_reactions(bot, message_id)
+    embed = None
+    files = []
+    if message is not None and not sql_message['is_trashed']:
+        embed, attachments = await functions.get_embed_from_message(
+            message
+        )
+        files = [(a.filename, a.fp.read()) for a in attachments]
+
+    semaphore = asyncio.Semaphore(bot_config.STARBOARD_CONCURRENCY)
+
+    async def run(sql_starboard):
+        async with semaphore:
+            start = time.perf_counter()
             await handle_starboard(
-                db, bot, sql_message, message, sql_starboard,
-                guild, on_cooldown=on_cooldown
+                db, bot, sql_message, message, sql_starboard, guild,
+                sql_author, reactions, embed, files,
+                on_cooldown=on_cooldown
             )
+            metrics.starboard_latency.observe(time.perf_counter() - start)
+
+    await asyncio.gather(*[run(s) for s in sql_starboards])
 
 
 async def handle_starboard(
@@ -736,64 +858,34 @@ async def handle_starboard(
     message: Optional[discord.Message],
     sql_starboard: dict,
     guild: discord.Guild,
+    sql_author: dict,
+    reactions: List[dict],
+    embed: Optional[discord.Embed],
+    files: List[Tuple[str, bytes]],
     on_cooldown=False
 ) -> None:
-    get_starboard_message = \
-        """SELECT * FROM messages WHERE orig_message_id=$1 AND channel_id=$2"""
-    delete_starboard_message = \
-        """DELETE FROM messages WHERE orig_message_id=$1 and channel_id=$2"""
-    get_author = \
-        """SELECT * FROM users WHERE id=$1"""
-    get_sbemojis = \
-        """SELECT * FROM sbemojis WHERE starboard_id=$1"""
-
     starboard_id = sql_starboard['id']
     starboard = bot.get_channel(int(starboard_id))
 
     if starboard is None:
         return
 
-    async with db.lock:
-        conn = await db.connect()
+    async with db.acquire() as conn:
         async with conn.transaction():
-            sql_author = await conn.fetchrow(
-                get_author, sql_message['user_id']
-            )
-            sql_starboard_message = await conn.fetchrow(
-                get_starboard_message, sql_message['id'], sql_starboard['id']
-            )
+            sql_starboard_message = \
+                await db.message_rows.fetch_starboard_message(
+                    conn, sql_message['id'], sql_starboard['id']
+                )
 
-    delete = False
     if sql_starboard_message is None:
         starboard_message = None
     else:
-        starboard_message_id = sql_starboard_message['id']
-        if starboard is not None:
-            try:
-                starboard_message = await functions.fetch(
-                    bot, int(starboard_message_id), starboard
-                )
-            except discord.errors.NotFound:
-                starboard_message = None
-                async with db.lock:
-                    conn = await db.connect()
-                    async with conn.transaction():
-                        await conn.execute(
-                            delete_starboard_message, sql_message['id'],
-                            sql_starboard['id']
-                        )
-        else:
-            starboard_message = None
-            delete = True
-
-    async with db.lock:
-        conn = await db.connect()
-        async with conn.transaction():
-            if delete:
-                await conn.execute(
-                    delete_starboard_message, sql_message['id'],
-                    sql_starboard['id']
-                )
+        # The starboard message is only ever edited or deleted, which
+        # a partial message can do without fetching it first. If it
+        # turns out to be gone, update_message cleans up after it.
+        starboard_message = starboard.get_partial_message(
+            int(sql_starboard_message['id'])
+        )
 
     recount = True
     if sql_starboard_message is not None and\
@@ -805,14 +897,12 @@ async def handle_starboard(
 
     if recount:
         points, emojis = await functions.calculate_points(
-            conn, sql_message, sql_starboard, bot,
-            guild
+            sql_message, sql_starboard, bot, guild, reactions
         )
     else:
         points = sql_starboard_message['points']
-        async with bot.db.lock:
-            async with conn.transaction():
-                emojis = await conn.fetch(get_sbemojis, sql_starboard['id'])
+        config = await bot.db.config_cache.get(guild.id)
+        emojis = config['sbemojis'].get(int(sql_starboard['id']), [])
 
     deleted = message is None
     blacklisted = False if deleted else \
@@ -865,15 +955,74 @@ async def handle_starboard(
     await update_message(
         db, message, sql_message['channel_id'], starboard_message,
         starboard, points, forced, frozen, trashed, add, remove, link_edits,
-        emojis, on_cooldown=on_cooldown
+        emojis, embed, files, on_cooldown=on_cooldown
     )
 
 
+def embed_fingerprint(
+    embed: Optional[discord.Embed]
+) -> Optional[int]:
+    if embed is None:
+        return None
+    return hash(json.dumps(embed.to_dict(), sort_keys=True, default=str))
+
+
+def remember_render(
+    message_id: int,
+    content: Optional[str],
+    fingerprint: Optional[int]
+) -> None:
+    rendered[message_id] = (content, fingerprint)
+    rendered.move_to_end(message_id)
+    while len(rendered) > bot_config.RENDER_CACHE_SIZE:
+        rendered.popitem(last=False)
+
+
+async def edit_if_changed(
+    sb_message: discord.PartialMessage,
+    **fields
+) -> None:
+    """Edits a starboard message, unless it was last sent or edited
+    with the same content and embed. Raises NotFound like edit.
+
+    A skipped edit never finds out the message was deleted, so that
+    is left to the message delete listeners of the Starboard cog."""
+    previous = rendered.get(sb_message.id, (None, None))
+    new = (
+        fields.get('content', previous[0]),
+        embed_fingerprint(fields['embed']) if 'embed' in fields
+        else previous[1]
+    )
+    if sb_message.id in rendered and new == previous:
+        rendered.move_to_end(sb_message.id)
+        metrics.starboard_edits.inc(result='skipped')
+        return
+
+    await sb_message.edit(**fields)
+    metrics.starboard_edits.inc(result='sent')
+    remember_render(sb_message.id, *new)
+
+
+async def forget_starboard_message(
+    db: Database,
+    message_id: int
+) -> None:
+    """Removes the row of a starboard message that was deleted"""
+    delete_message = \
+        """DELETE FROM messages WHERE id=$1 AND is_orig=False"""
+
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(delete_message, message_id)
+    db.message_rows.remove(message_id)
+    rendered.pop(message_id, None)
+
+
 async def update_message(
     db: Database,
     orig_message: Optional[discord.Message],
     orig_channel_id: int,
-    sb_message: Optional[discord.Message],
+    sb_message: Optional[discord.PartialMessage],
     starboard: discord.TextChannel,
     points: int,
     forced: bool,
@@ -883,6 +1032,8 @@ async def update_message(
     remove: bool,
     link_edits: bool,
     emojis: List[dict],
+    embed: Optional[discord.Embed],
+    files: List[Tuple[str, bytes]],
     on_cooldown: bool = False
 ) -> None:
     update = orig_message is not None
@@ -896,32 +1047,33 @@ async def update_message(
             embed.description = "This message was trashed by a moderator."
             if not on_cooldown:
                 try:
-                    await sb_message.edit(embed=embed)
+                    await edit_if_changed(sb_message, embed=embed)
                 except discord.errors.NotFound:
-                    pass
+                    await forget_starboard_message(db, sb_message.id)
     elif remove:
-        try:
-            if sb_message is not None:
+        if sb_message is not None:
+            try:
                 await sb_message.delete()
-        except discord.errors.NotFound:
-            pass
+            except discord.errors.NotFound:
+                pass
+            await forget_starboard_message(db, sb_message.id)
     else:
         plain_text = (
             f"**{points} | <#{orig_channel_id}>{' | 🔒' if forced else ''}"
             f"{' | ❄️' if frozen else ''}**"
         )
 
-        embed, attachments = await functions.get_embed_from_message(
-            orig_message
-        ) if orig_message is not None else (None, None)
+        # Files can only be sent once, so each starboard gets its own
+        attachments = [
+            discord.File(io.BytesIO(data), filename=filename)
+            for filename, data in files
+        ]
 
         if add and embed is not None:
-            async with db.lock:
-                conn = db.conn
+            async with db.acquire() as conn:
                 async with conn.transaction():
-                    _message = await conn.fetchrow(
-                        check_message, orig_message.id,
-                        starboard.id
+                    _message = await db.message_rows.fetch_starboard_message(
+                        conn, orig_message.id, starboard.id
                     )
             if _message is not None:
                 return
@@ -932,15 +1084,15 @@ async def update_message(
             except discord.errors.Forbidden:
                 pass
             else:
-                async with db.lock:
-                    conn = await db.connect()
+                async with db.acquire() as conn:
                     async with conn.transaction():
                         _message = await conn.fetchrow(
                             check_message, orig_message.id,
                             starboard.id
                         )
                         if _message is None:
-                            await db.q.create_message.fetch(
+                            new_row = await conn.fetchrow(
+                                db.q.create_message,
                                 sb_message.id, sb_message.guild.id,
                                 orig_message.author.id, orig_message.id,
                                 starboard.id, False,
@@ -949,16 +1101,29 @@ async def update_message(
                 if _message is not None:
                     print("### DUPLICATE DELETED ###")
                     await sb_message.delete()
+                else:
+                    db.message_rows.put(new_row)
+                    remember_render(
+                        sb_message.id, plain_text, embed_fingerprint(embed)
+                    )
 
         elif update and sb_message and link_edits:
             if not on_cooldown:
-                await sb_message.edit(
-                    content=plain_text, embed=embed
-                )
+                try:
+                    await edit_if_changed(
+                        sb_message, content=plain_text, embed=embed
+                    )
+                except discord.errors.NotFound:
+                    await forget_starboard_message(db, sb_message.id)
+                    sb_message = None
         elif sb_message:
-            await sb_message.edit(
-                content=plain_text
-            )
+            try:
+                await edit_if_changed(
+                    sb_message, content=plain_text
+                )
+            except discord.errors.NotFound:
+                await forget_starboard_message(db, sb_message.id)
+                sb_message = None
     if sb_message is not None and not remove and add:
         for _emoji in emojis:
             if _emoji['d_id'] is not None:
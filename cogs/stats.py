@@ -1,14 +1,17 @@
 # Put here for ease of use with statcord
+import asyncio
 import os
 import json
+from typing import Coroutine, Dict
 
 import dbl
+import discord
 import statcord
 from discord.ext import tasks
-from aiohttp_requests import requests
 from discord.ext import commands
 from dotenv import load_dotenv
 
+from api.client import client
 from bot_config import OWNER_ID
 
 load_dotenv()
@@ -34,7 +37,7 @@ async def post_bod(
     data = json.dumps({"guildCount": guilds})
     url = f"https://bots.ondiscord.xyz/bot-api/bots/{bot_user_id}/guilds"
 
-    r = await requests.post(url, data=data, headers=headers)
+    r = await client.post(url, data=data, headers=headers)
     return await r.text()
 
 
@@ -50,7 +53,7 @@ async def post_dbl(
     })
     url = f"https://discordbotlist.com/api/v1/bots/{bot_user_id}/stats"
 
-    r = await requests.post(url, data=data, headers=headers)
+    r = await client.post(url, data=data, headers=headers)
     return await r.text()
 
 
@@ -67,7 +70,7 @@ async def post_boats(
     })
     url = f"https://discord.boats/api/bot/{bot_user_id}"
 
-    r = await requests.post(url, data=data, headers=headers)
+    r = await client.post(url, data=data, headers=headers)
     return await r.text()
 
 
@@ -81,7 +84,7 @@ async def post_dbgg(
     })
     url = f"https://discord.bots.gg/api/v1/bots/{bot_user_id}/stats"
 
-    r = await requests.post(url, data=data, headers=headers)
+    r = await client.post(url, data=data, headers=headers)
     return await r.text()
 
 
@@ -95,7 +98,7 @@ async def post_del(
     })
     url = f"https://api.discordextremelist.xyz/v2/bot/{bot_user_id}/stats"
 
-    r = await requests.post(url, data=data, headers=headers)
+    r = await client.post(url, data=data, headers=headers)
     return await r.text()
 
 
@@ -110,29 +113,39 @@ async def post_labs(
     })
     url = f"https://bots.discordlabs.org/v2/bot/{bot_user_id}/stats"
 
-    r = await requests.post(url, data=data, headers=headers)
+    r = await client.post(url, data=data, headers=headers)
     return await r.text()
 
 
+async def _post(
+    coro: Coroutine
+) -> str:
+    # Long enough for the client to go through all of its retries,
+    # so a bot list is only given up on once those have failed too
+    timeout = client.max_request_time() + 1
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        return f"Timed out after {timeout} seconds"
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
 async def post_all(
     guilds: int,
     users: int,
     bot_user_id: int
-) -> str:
-    bod = await post_bod(guilds, bot_user_id)
-    dbl = await post_dbl(guilds, users, bot_user_id)
-    boats = await post_boats(guilds, bot_user_id)
-    dbgg = await post_dbgg(guilds, bot_user_id)
-    bdel = await post_del(guilds, bot_user_id)
-    labs = await post_labs(guilds, bot_user_id)
-    return {
-        'bots.ondiscord.xyz': bod,
-        'discordbotlist.com': dbl,
-        'discord.boats': boats,
-        'discord.bots.gg': dbgg,
-        'discordextremelist.xyz': bdel,
-        'bots.discordlabs.org': labs
+) -> Dict[str, str]:
+    sites = {
+        'bots.ondiscord.xyz': post_bod(guilds, bot_user_id),
+        'discordbotlist.com': post_dbl(guilds, users, bot_user_id),
+        'discord.boats': post_boats(guilds, bot_user_id),
+        'discord.bots.gg': post_dbgg(guilds, bot_user_id),
+        'discordextremelist.xyz': post_del(guilds, bot_user_id),
+        'bots.discordlabs.org': post_labs(guilds, bot_user_id)
     }
+    results = await asyncio.gather(*[_post(c) for c in sites.values()])
+    return dict(zip(sites, results))
 
 
 class PostOther(commands.Cog):
@@ -142,20 +155,65 @@ class PostOther(commands.Cog):
         bot: commands.Bot
     ) -> None:
         self.bot = bot
+        # Kept up to date by the listeners below, so the
+        # guilds don't have to be counted every time
+        self.member_count = None
+        self.last_results = {}
         self.post_bot_stats.start()
 
-    @tasks.loop(minutes=60)
-    async def post_bot_stats(self):
-        await self.bot.wait_until_ready()
+    def count_members(self) -> int:
         users = 0
         for g in self.bot.guilds:
             try:
                 users += g.member_count
             except AttributeError:
                 pass
-        await post_all(
+        return users
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        self.member_count = self.count_members()
+
+    @commands.Cog.listener()
+    async def on_guild_join(
+        self,
+        guild: discord.Guild
+    ) -> None:
+        if self.member_count is not None:
+            self.member_count += guild.member_count or 0
+
+    @commands.Cog.listener()
+    async def on_guild_remove(
+        self,
+        guild: discord.Guild
+    ) -> None:
+        if self.member_count is not None:
+            self.member_count -= guild.member_count or 0
+
+    @commands.Cog.listener()
+    async def on_member_join(
+        self,
+        member: discord.Member
+    ) -> None:
+        if self.member_count is not None:
+            self.member_count += 1
+
+    @commands.Cog.listener()
+    async def on_member_remove(
+        self,
+        member: discord.Member
+    ) -> None:
+        if self.member_count is not None:
+            self.member_count -= 1
+
+    @tasks.loop(minutes=60)
+    async def post_bot_stats(self):
+        await self.bot.wait_until_ready()
+        if self.member_count is None:
+            self.member_count = self.count_members()
+        self.last_results = await post_all(
             len(self.bot.guilds),
-            users,
+            self.member_count,
             self.bot.user.id
         )
 
@@ -1,3 +1,7 @@
+import asyncio
+import traceback
+from typing import Optional
+
 import discord
 from discord.ext import commands, flags
 from discord.ext.commands import BucketType
@@ -15,11 +19,66 @@ async def scan_recount(
     bot: commands.Bot,
     channel: discord.TextChannel,
     messages: int,
-    start_date=None
+    start_date=None,
+    progress: Optional[discord.Message] = None
 ) -> None:
-    async for m in channel.history(limit=messages, before=start_date):
-        if await functions.needs_recount(bot, m):
-            await functions.recount_reactions(bot, m)
+    """Recounts the reactions on the last few messages of a channel.
+    One task reads the history while RECOUNT_WORKERS others recount
+    the messages it finds. If progress is passed, it is edited to
+    show how far along the scan is."""
+    workers = bot_config.RECOUNT_WORKERS
+    queue = asyncio.Queue(maxsize=workers * 2)
+    counts = {'scanned': 0, 'recounted': 0}
+
+    async def read_history():
+        try:
+            async for m in channel.history(limit=messages, before=start_date):
+                await queue.put(m)
+                counts['scanned'] += 1
+        finally:
+            for _ in range(workers):
+                await queue.put(None)
+
+    async def recount():
+        while True:
+            m = await queue.get()
+            if m is None:
+                return
+            try:
+                if await functions.needs_recount(bot, m):
+                    await functions.recount_reactions(bot, m)
+                    counts['recounted'] += 1
+            except Exception:
+                traceback.print_exc()
+
+    async def report():
+        while True:
+            await asyncio.sleep(bot_config.RECOUNT_PROGRESS_SECONDS)
+            try:
+                await progress.edit(
+                    content=f"Scanned {counts['scanned']}/{messages} "
+                    f"messages, recounted {counts['recounted']}."
+                )
+            except discord.HTTPException:
+                pass
+
+    reporter = asyncio.ensure_future(report()) if progress else None
+    try:
+        await asyncio.gather(
+            read_history(), *[recount() for _ in range(workers)]
+        )
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+
+    if progress is not None:
+        try:
+            await progress.edit(
+                content=f"Scanned {counts['scanned']} messages, "
+                f"recounted {counts['recounted']}."
+            )
+        except discord.HTTPException:
+            pass
 
 
 async def handle_trashing(
@@ -29,8 +88,6 @@ async def handle_trashing(
     _message_id: int,
     trash: bool
 ) -> None:
-    check_message = \
-        """SELECT * FROM messages WHERE id=$1"""
     trash_message = \
         """UPDATE messages
         SET is_trashed=$1
@@ -38,14 +95,13 @@ async def handle_trashing(
 
     status = True
 
-    async with db.lock:
-        conn = await db.connect()
+    async with db.acquire() as conn:
         async with conn.transaction():
             message_id, channel_id = await functions.orig_message_id(
                 db, conn, _message_id
             )
 
-            sql_message = await conn.fetchrow(check_message, message_id)
+            sql_message = await db.message_rows.fetch(conn, message_id)
             if sql_message is None:
                 await ctx.send(
                     "That message either has no reactions or does not exist"
@@ -54,6 +110,9 @@ async def handle_trashing(
             else:
                 await conn.execute(trash_message, trash, message_id)
 
+    if status is True:
+        db.message_rows.update(message_id, is_trashed=trash)
+
     channel = bot.get_channel(int(channel_id))
     try:
         message = await functions.fetch(bot, message_id, channel)
@@ -74,8 +133,6 @@ async def handle_forcing(
     _message_id: int,
     force: bool
 ) -> None:
-    check_message = \
-        """SELECT * FROM messages WHERE id=$1"""
     force_message = \
         """UPDATE messages
         SET is_forced=$1
@@ -94,8 +151,7 @@ async def handle_forcing(
         await ctx.send("I can't find that channel")
         return
 
-    async with bot.db.lock:
-        conn = await bot.db.connect()
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             message_id, channel_id = await functions.orig_message_id(
                 bot.db, conn, _message_id
@@ -112,18 +168,23 @@ async def handle_forcing(
         do_member=True
     )
 
-    async with bot.db.lock:
-        conn = await bot.db.connect()
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
-            sql_message = await conn.fetchrow(check_message, message_id)
+            sql_message = await bot.db.message_rows.fetch(conn, message_id)
+            new_row = None
             if sql_message is None:
-                await bot.db.q.create_message.fetch(
+                new_row = await conn.fetchrow(
+                    bot.db.q.create_message,
                     message.id, ctx.guild.id, message.author.id,
                     None, message.channel.id, True,
                     message.channel.is_nsfw()
                 )
             await conn.execute(force_message, force, message.id)
 
+    if new_row is not None:
+        bot.db.message_rows.put(new_row)
+    bot.db.message_rows.update(message.id, is_forced=force)
+
     await ctx.send(
         "Message forced." if force else
         "Message unforced."
@@ -231,9 +292,10 @@ class Utility(commands.Cog):
             except (discord.errors.NotFound, discord.errors.Forbidden):
                 msg = None
 
+        progress = await ctx.send(f"Scanning {messages} messages...")
         async with ctx.typing():
             await scan_recount(
-                self.bot, ctx.channel, messages, msg
+                self.bot, ctx.channel, messages, msg, progress
             )
 
         await ctx.send("Finished")
@@ -253,8 +315,7 @@ class Utility(commands.Cog):
             """SELECT * FROM messages
             WHERE is_frozen = True AND guild_id=$1"""
 
-        async with self.db.lock:
-            conn = await self.db.connect()
+        async with self.db.acquire() as conn:
             async with conn.transaction():
                 frozen_messages = await conn.fetch(get_frozen, ctx.guild.id)
 
@@ -307,8 +368,7 @@ class Utility(commands.Cog):
             SET is_frozen = True
             WHERE id=$1"""
 
-        async with self.db.lock:
-            conn = await self.db.connect()
+        async with self.db.acquire() as conn:
             async with conn.transaction():
                 message_id, _orig_channel_id = await functions.orig_message_id(
                     self.db, conn, message
@@ -324,6 +384,9 @@ class Utility(commands.Cog):
                 await conn.execute(freeze_message, message_id)
                 message = f"Message **{message_id}** is now frozen"
 
+        if sql_message:
+            self.db.message_rows.update(message_id, is_frozen=True)
+
         mid = int(sql_message['id'])
         cid = int(sql_message['channel_id'])
         channel = self.bot.get_channel(cid)
@@ -358,8 +421,7 @@ class Utility(commands.Cog):
             SET is_frozen = False
             WHERE id=$1"""
 
-        async with self.db.lock:
-            conn = await self.db.connect()
+        async with self.db.acquire() as conn:
             async with conn.transaction():
                 message_id, _orig_channel_id = await functions.orig_message_id(
                     self.db, conn, message
@@ -374,6 +436,9 @@ class Utility(commands.Cog):
                     await conn.execute(freeze_message, message_id)
                     message = f"Message **{message_id}** is now unfrozen"
 
+        if sql_message:
+            self.db.message_rows.update(message_id, is_frozen=False)
+
         mid = int(sql_message['id'])
         cid = int(sql_message['channel_id'])
         channel = self.bot.get_channel(cid)
@@ -475,8 +540,7 @@ class Utility(commands.Cog):
         self,
         ctx: commands.Context
     ) -> None:
-        cache = self.bot.db.cache
-        cache._messages[ctx.guild.id] = []
+        self.bot.db.cache.clear(ctx.guild.id)
         await ctx.send("Message cache cleared")
 
     @commands.command(
@@ -498,8 +562,7 @@ class Utility(commands.Cog):
 
         sql_sb_messages = []
 
-        async with self.db.lock:
-            conn = await self.bot.db.connect()
+        async with self.db.acquire() as conn:
             async with conn.transaction():
                 orig_message_id, _ = await functions.orig_message_id(
                     self.bot.db, conn, message_id
@@ -602,9 +665,6 @@ class Utility(commands.Cog):
         total_reactions = sum([r.count for r in message.reactions])
         eta = int(total_reactions / 100 * 5 + total_reactions * 0.1)
 
-        check_message = \
-            """SELECT * FROM messages WHERE id=$1"""
-
         await functions.check_or_create_existence(
             self.bot,
             guild_id=ctx.guild.id,
@@ -612,20 +672,24 @@ class Utility(commands.Cog):
             do_member=True
         )
 
-        conn = self.bot.db.conn
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
-                sql_message = await conn.fetchrow(
-                    check_message, message.id
+                sql_message = await self.bot.db.message_rows.fetch(
+                    conn, message.id
                 )
+                new_row = None
                 if sql_message is None:
-                    await self.bot.db.q.create_message.fetch(
+                    new_row = await conn.fetchrow(
+                        self.bot.db.q.create_message,
                         message.id, message.guild.id,
                         message.author.id, None,
                         message.channel.id, True,
                         message.channel.is_nsfw()
                     )
 
+        if new_row is not None:
+            self.bot.db.message_rows.put(new_row)
+
         if sql_message is not None:
             if not sql_message['is_orig']:
                 await ctx.send(
@@ -678,9 +742,7 @@ class Utility(commands.Cog):
             """SELECT * FROM aschannels
             WHERE id=$1"""
 
-        conn = self.bot.db.conn
-
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 is_sb = await conn.fetchrow(
                     get_starboard, current_channel.id
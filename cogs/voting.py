@@ -53,21 +53,22 @@ async def add_vote(
     user_id: int
 ) -> None:
     e = expires()
-    conn = bot.db.conn
 
     check_user = \
         """SELECT * FROM users WHERE id=$1"""
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_user = await conn.fetchrow(
                 check_user, user_id
             )
             if sql_user is None:
-                await bot.db.q.create_user.fetch(
+                await conn.execute(
+                    bot.db.q.create_user,
                     user_id, False
                 )
-            await bot.db.q.create_vote.fetch(
+            await conn.execute(
+                bot.db.q.create_vote,
                 user_id, e
             )
 
@@ -125,11 +126,10 @@ class Voting(commands.Cog):
             SET expired=True
             WHERE id=$1"""
         ct = now()
-        conn = self.bot.db.conn
 
         to_remove = []
 
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 expired_votes = await conn.fetch(
                     get_votes, ct
@@ -164,9 +164,8 @@ class Voting(commands.Cog):
             """SELECT * FROM votes WHERE user_id=$1"""
 
         user = user or ctx.message.author
-        conn = self.bot.db.conn
 
-        async with self.bot.db.lock:
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 votes = await conn.fetch(get_votes, user.id)
 
@@ -6,12 +6,14 @@ from aiohttp import web
 from discord.ext import commands
 from dotenv import load_dotenv
 
+import metrics
 from database.database import Database
 
 load_dotenv()
 
 HOOK_AUTH = os.getenv("TOP_HOOK_AUTH")
 PATREON_AUTH = os.getenv("PATREON_AUTH")
+METRICS_AUTH = os.getenv("METRICS_AUTH")
 
 
 class HttpWebHook():
@@ -49,6 +51,14 @@ class HttpWebHook():
         )
         return sig == digester.hexdigest()
 
+    def verify_metrics(
+        self,
+        auth: str
+    ) -> bool:
+        if METRICS_AUTH is None:
+            return False
+        return hmac.compare_digest(auth, f"Bearer {METRICS_AUTH}")
+
     def _set_routes(self) -> None:
         # @self.routes.post('/webhook')
         # async def donation_event(request):
@@ -91,6 +101,17 @@ class HttpWebHook():
                 self.bot.dispatch('patreon_event', text)
                 return "Caught", 200
 
+        @self.routes.get('/metrics')
+        async def get_metrics(request):
+            if not self.verify_metrics(
+                request.headers.get('authorization', '')
+            ):
+                return web.Response(body='Invalid Token', status=401)
+            return web.Response(
+                text=await metrics.render(self.bot),
+                content_type='text/plain'
+            )
+
         @self.routes.get('')
         async def ping(request):
             return web.Response(body="I'm Here!", status=200)
@@ -100,8 +121,7 @@ class HttpWebHook():
     # async def handle_donation_event(self, data):
     #    product_id = None if 'product_id' not in data else data['product_id']
     #    role_id = None if 'role_id' not in data else data['role_id']
-    #    async with self.db.lock:
-    #        conn = await self.db.connect()
+    #    async with self.db.acquire() as conn:
     #        async with conn.transaction():
     #            await conn.execute(
     #                self.db.q.create_donation,
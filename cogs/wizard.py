@@ -101,8 +101,7 @@ class SetupWizard:
     async def new_aschannel(self) -> None:
         get_aschannels = """SELECT * FROM aschannels WHERE guild_id=$1"""
 
-        async with self.bot.db.lock:
-            conn = self.bot.db.conn
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_aschannels = await conn.fetch(
                     get_aschannels, self.ctx.guild.id
@@ -230,8 +229,7 @@ class SetupWizard:
     async def new_starboard(self) -> None:
         get_starboards = """SELECT * FROM starboards WHERE guild_id=$1"""
 
-        async with self.bot.db.lock:
-            conn = self.bot.db.conn
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_starboards = await conn.fetch(
                     get_starboards, self.ctx.guild.id
@@ -367,8 +365,7 @@ class SetupWizard:
         get_emojis = """SELECT * FROM sbemojis WHERE starboard_id=$1"""
         modifying = True
         while modifying:
-            async with self.bot.db.lock:
-                conn = self.bot.db.conn
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     _emojis = await conn.fetch(get_emojis, channel.id)
                     emojis = await pretty_emoji_string(_emojis, self.ctx.guild)
@@ -391,8 +388,7 @@ class SetupWizard:
         get_emojis = """SELECT * FROM asemojis WHERE aschannel_id=$1"""
         modifying = True
         while modifying:
-            async with self.bot.db.lock:
-                conn = self.bot.db.conn
+            async with self.bot.db.acquire() as conn:
                 async with conn.transaction():
                     _emojis = await conn.fetch(get_emojis, channel.id)
                     emojis = await pretty_emoji_string(_emojis, self.ctx.guild)
@@ -418,8 +414,7 @@ class SetupWizard:
             self.bot, 'asemojis', self.ctx.guild.id
         )
 
-        async with self.bot.db.lock:
-            conn = self.bot.db.conn
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_emojis = await conn.fetch(get_emojis, channel.id)
 
@@ -481,8 +476,7 @@ class SetupWizard:
             self.bot, 'emojis', self.ctx.guild.id
         )
 
-        async with self.bot.db.lock:
-            conn = self.bot.db.conn
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_emojis = await conn.fetch(get_emojis, channel.id)
 
@@ -641,8 +635,7 @@ class SetupWizard:
         get_emojis = \
             """SELECT * FROM asemojis WHERE aschannel_id=$1"""
 
-        async with self.bot.db.lock:
-            conn = self.bot.db.conn
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_aschannel = await conn.fetchrow(
                     get_aschannel, channel.id
@@ -670,8 +663,7 @@ class SetupWizard:
         get_emojis = \
             """SELECT * FROM sbemojis WHERE starboard_id=$1"""
 
-        async with self.bot.db.lock:
-            conn = await self.bot.db.connect()
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_starboard = await conn.fetchrow(
                     get_starboard, channel.id
@@ -699,8 +691,7 @@ class SetupWizard:
         channel_id: int
     ) -> bool:
         check = """SELECT * FROM starboards WHERE id=$1"""
-        async with self.bot.db.lock:
-            conn = self.bot.db.conn
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_staboard = await conn.fetchrow(check, channel_id)
         if sql_staboard is None:
@@ -735,8 +726,7 @@ class SetupWizard:
         prompt: str
     ) -> Union[dict, None]:
         get_aschannels = """SELECT * FROM aschannels WHERE guild_id=$1"""
-        async with self.bot.db.lock:
-            conn = self.bot.db.conn
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_aschannels = await conn.fetch(
                     get_aschannels, self.ctx.guild.id
@@ -766,8 +756,7 @@ class SetupWizard:
         prompt: str
     ) -> dict:
         get_starboards = """SELECT * FROM starboards WHERE guild_id=$1"""
-        async with self.bot.db.lock:
-            conn = self.bot.db.conn
+        async with self.bot.db.acquire() as conn:
             async with conn.transaction():
                 sql_starboards = await conn.fetch(
                     get_starboards, self.ctx.guild.id
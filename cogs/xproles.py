@@ -1,5 +1,6 @@
-from typing import List
-from copy import deepcopy
+import traceback
+from bisect import bisect_left
+from typing import Dict, List, Set, Tuple
 
 import discord
 from discord.ext import commands, tasks
@@ -13,8 +14,7 @@ async def is_pr(
     bot: commands.Bot,
     role_id: int
 ) -> bool:
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             exists = await conn.fetchrow(
                 """SELECT * FROM posroles
@@ -23,61 +23,102 @@ async def is_pr(
     return exists
 
 
-async def update_user_xproles(
+# {guild_id: ([req_xp, ...], [role_id, ...])}, sorted by req_xp
+thresholds: Dict[int, Tuple[List[int], List[int]]] = {}
+
+
+async def get_thresholds(
+    bot: commands.Bot,
+    guild_id: int
+) -> Tuple[List[int], List[int]]:
+    """Returns the guild's XP Roles as two parallel lists, sorted
+    by required XP so they can be searched with bisect"""
+    fetch_roles = \
+        """SELECT * FROM xproles WHERE guild_id=$1
+        ORDER by req_xp ASC"""
+
+    cached = thresholds.get(guild_id)
+    if cached is not None:
+        return cached
+
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            sql_xp_roles = await conn.fetch(
+                fetch_roles, guild_id
+            )
+
+    cached = (
+        [int(r['req_xp']) for r in sql_xp_roles],
+        [int(r['id']) for r in sql_xp_roles]
+    )
+    thresholds[guild_id] = cached
+    return cached
+
+
+async def update_guild_xproles(
     bot: commands.Bot,
     guild: discord.Guild,
-    user: discord.Member
-) -> None:
-    get_member = \
-        """SELECT * FROM members
-        WHERE user_id=$1
-        AND guild_id=$2"""
+    user_ids: Set[int]
+) -> int:
+    """Gives and removes XP Roles for some members of a guild.
+    Returns the number of members that were edited."""
+    get_members = \
+        """SELECT user_id, xp FROM members
+        WHERE guild_id=$1
+        AND user_id=ANY($2::numeric[])"""
 
     limit = await functions.get_limit(
         bot, 'xproles', guild.id
     )
     if limit is False:
-        return
+        return 0
 
-    conn = bot.db.conn
+    req_xps, role_ids = await get_thresholds(bot, guild.id)
+    if role_ids == []:
+        return 0
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
-            sql_member = await conn.fetchrow(
-                get_member, user.id, guild.id
+            sql_members = await conn.fetch(
+                get_members, guild.id, list(user_ids)
             )
-
-    xp = int(sql_member['xp'])
-    gets_xp_roles: List[int] = [
-        int(r['id']) for r in
-        await get_roles_by_xp(
-            bot, guild.id, xp, True
-        )
-    ]
-    all_xp_roles: List[int] = [
-        int(r['id']) for r in
-        await get_xp_roles(
-            bot, guild
-        )
-    ]
-    has_roles_ids: List[int] = [r.id for r in user.roles]
-
-    remove_roles = []
-    give_roles = []
-
-    for role in guild.roles:
-        if role.position >= guild.me.top_role.position:
-            # the bot can't edit this role
+    xps = {int(m['user_id']): int(m['xp']) for m in sql_members}
+
+    # Roles the bot is able to give or take
+    editable = {}
+    for role_id in role_ids:
+        role = guild.get_role(role_id)
+        if role is not None\
+                and role.position < guild.me.top_role.position:
+            editable[role_id] = role
+
+    edited = 0
+    for member in await functions.get_members(xps.keys(), guild):
+        # Members get every role they have more than the required XP for
+        earned = set(role_ids[:bisect_left(req_xps, xps[member.id])])
+        # Only the XP Roles that changed are added or removed, so
+        # other role changes made in the meantime are left alone
+        has = {r.id for r in member.roles}
+        to_add = [
+            role for rid, role in editable.items()
+            if rid in earned and rid not in has
+        ]
+        to_remove = [
+            role for rid, role in editable.items()
+            if rid not in earned and rid in has
+        ]
+        if to_add == [] and to_remove == []:
+            continue
+        try:
+            if to_add != []:
+                await member.add_roles(*to_add)
+            if to_remove != []:
+                await member.remove_roles(*to_remove)
+        except discord.HTTPException:
             continue
-        if role.id in all_xp_roles\
-                and role.id in has_roles_ids\
-                and role.id not in gets_xp_roles:
-            remove_roles.append(role)
-        elif role.id in all_xp_roles and role.id in gets_xp_roles:
-            give_roles.append(role)
+        edited += 1
 
-    await user.remove_roles(*remove_roles)
-    await user.add_roles(*give_roles)
+    return edited
 
 
 async def get_xp_roles(
@@ -88,9 +129,7 @@ async def get_xp_roles(
         """SELECT * FROM xproles WHERE guild_id=$1
         ORDER by req_xp DESC"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_xp_roles = await conn.fetch(
                 fetch_roles, guild.id
@@ -99,31 +138,6 @@ async def get_xp_roles(
     return sql_xp_roles
 
 
-async def get_roles_by_xp(
-    bot: commands.Bot,
-    guild_id: int,
-    xp: int,
-    stack: bool
-) -> List[dict]:
-    fetch_roles = \
-        """SELECT * FROM xproles
-        WHERE guild_id=$1
-        AND req_xp<$2
-        ORDER BY req_xp DESC
-        LIMIT $3"""
-
-    conn = bot.db.conn
-
-    async with bot.db.lock:
-        async with conn.transaction():
-            sql_roles = await conn.fetch(
-                fetch_roles, guild_id,
-                xp, None if stack else 1
-            )
-
-    return sql_roles
-
-
 async def add_xp_role(
     bot: commands.Bot,
     role: discord.Role,
@@ -147,9 +161,7 @@ async def add_xp_role(
             "page of `sb!tutorial` for more info."
         )
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             current_num = await conn.fetchval(
                 """SELECT COUNT(*) FROM xproles
@@ -176,13 +188,14 @@ async def add_xp_role(
         """INSERT INTO xproles (id, guild_id, req_xp)
         VALUES ($1, $2, $3)"""
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 create_xp_role,
                 role.id, role.guild.id,
                 req_xp
             )
+    thresholds.pop(role.guild.id, None)
 
 
 async def del_xp_role(
@@ -191,15 +204,16 @@ async def del_xp_role(
 ) -> None:
     sql_del_role = \
         """DELETE FROM xproles
-        WHERE id=$1"""
-
-    conn = bot.db.conn
+        WHERE id=$1
+        RETURNING guild_id"""
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
-            await conn.execute(
+            guild_id = await conn.fetchval(
                 sql_del_role, role_id
             )
+    if guild_id is not None:
+        thresholds.pop(int(guild_id), None)
 
 
 async def set_role_xp(
@@ -210,15 +224,16 @@ async def set_role_xp(
     alter_role = \
         """UPDATE xproles
         SET req_xp=$1
-        WHERE id=$2"""
-
-    conn = bot.db.conn
+        WHERE id=$2
+        RETURNING guild_id"""
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
-            await conn.execute(
+            guild_id = await conn.fetchval(
                 alter_role, req_xp, role_id
             )
+    if guild_id is not None:
+        thresholds.pop(int(guild_id), None)
 
 
 class XPRoles(commands.Cog):
@@ -229,35 +244,51 @@ class XPRoles(commands.Cog):
         bot: commands.Bot
     ) -> None:
         self.bot = bot
-        self.queue = {}
+        # {guild_id: {ids of members whose xp changed}}
+        self.dirty = {}
+        self.stats = {'queued': 0, 'updated': 0, 'edits': 0}
         self.update_some_roles.start()
 
+    def cog_unload(self) -> None:
+        self.update_some_roles.cancel()
+
     @commands.Cog.listener()
     async def on_xpr_needs_update(
         self,
         guild_id: int,
         user_id: int
     ) -> None:
-        self.queue.setdefault(guild_id, [])
-        self.queue[guild_id].append(user_id)
+        self.dirty.setdefault(int(guild_id), set()).add(int(user_id))
+        self.stats['queued'] += 1
 
-    @tasks.loop(seconds=1)
+    @tasks.loop(seconds=bot_config.XPROLE_UPDATE_SECONDS)
     async def update_some_roles(self) -> None:
-        queue = deepcopy(self.queue)
-        for gid in queue:
-            if len(queue[gid]) == 0:
-                return
-            guild = self.bot.get_guild(gid)
-            uid = self.queue[gid].pop(0)
-            members = await functions.get_members(
-                [uid], guild
-            )
-            if len(members) == 0:
-                return
-            member = members[0]
-            await update_user_xproles(
-                self.bot, guild, member
-            )
+        if self.dirty == {}:
+            return
+        # Split the tick's budget evenly between waiting guilds.
+        # Guilds that still have members left go to the back of
+        # the line, so a busy guild can't starve the others.
+        budget = bot_config.XPROLE_USERS_PER_UPDATE
+        guild_ids = list(self.dirty)[:budget]
+        share = max(1, budget // len(guild_ids))
+        for guild_id in guild_ids:
+            pending = self.dirty.pop(guild_id)
+            batch = {pending.pop() for _ in range(min(share, len(pending)))}
+            if len(pending) != 0:
+                self.dirty.setdefault(guild_id, set()).update(pending)
+
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                continue
+            try:
+                edited = await update_guild_xproles(
+                    self.bot, guild, batch
+                )
+            except Exception:
+                traceback.print_exc()
+                continue
+            self.stats['updated'] += len(batch)
+            self.stats['edits'] += edited
 
     @commands.group(
         name='xproles', aliases=['xpr'],
@@ -1,3 +1,4 @@
+import heapq
 import time
 
 
@@ -69,11 +70,15 @@ class Cooldown:
 class CooldownMapping:
     def __init__(self, original):
         self._cache = {}
+        # (expires_at, key) for every key in _cache, so that old keys
+        # can be found without looking at the rest of them
+        self._expiry = []
         self._cooldown = original
 
     def copy(self):
         ret = CooldownMapping(self._cooldown)
         ret._cache = self._cache.copy()
+        ret._expiry = self._expiry.copy()
         return ret
 
     @property
@@ -93,11 +98,16 @@ class CooldownMapping:
         # cooldown of 60s and it has not been used in 60s then that
         # key should be deleted
         current = current or time.time()
-        dead_keys = [
-            k for k, v in self._cache.items() if current > v._last + v.per
-        ]
-        for k in dead_keys:
-            del self._cache[k]
+        expiry = self._expiry
+        while expiry and current > expiry[0][0]:
+            _, key = heapq.heappop(expiry)
+            bucket = self._cache[key]
+            expires_at = bucket._last + bucket.per
+            if current > expires_at:
+                del self._cache[key]
+            else:
+                # used since it was pushed, so check again later
+                heapq.heappush(expiry, (expires_at, key))
 
     def get_bucket(self, cooldown_key, current=None):
         self._verify_cache_integrity(current)
@@ -105,6 +115,7 @@ class CooldownMapping:
         if key not in self._cache:
             bucket = self._cooldown.copy()
             self._cache[key] = bucket
+            heapq.heappush(self._expiry, (bucket._last + bucket.per, key))
         else:
             bucket = self._cache[key]
 
@@ -1,11 +1,13 @@
 import asyncpg as apg
 import os
+import sys
 import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from discord.ext import commands
 from dotenv import load_dotenv
-from asyncio import Lock
 from discord import utils
-from typing import Any
+from typing import Any, AsyncIterator, List, Optional
 
 load_dotenv()
 db_pwd = os.getenv('DB_PWD')
@@ -25,44 +27,74 @@ class aobject(object):
         pass
 
 
+# Query times are counted in buckets that double in size, bucket i
+# holding everything under 2**(i+4) microseconds (the last one
+# holds everything slower than that too)
+SQL_HIST_SIZE = 24
+
+
+def sql_bucket_bound(
+    index: int
+) -> float:
+    """The upper bound of a histogram bucket, in seconds"""
+    return 2**(index+4) / 1_000_000
+
+
+def sql_percentile(
+    hist: List[int],
+    q: float
+) -> float:
+    """Estimates the q-th quantile (0-1) of a histogram in seconds,
+    as the upper bound of the bucket it falls in"""
+    total = sum(hist)
+    if total == 0:
+        return 0.0
+    needed = q * total
+    seen = 0
+    for index, count in enumerate(hist):
+        seen += count
+        if seen >= needed:
+            return sql_bucket_bound(index)
+    return sql_bucket_bound(len(hist) - 1)
+
+
 class CustomConn:
     def __init__(
         self,
-        realcon: apg.Connection
+        realcon: apg.Connection,
+        sql_dict: dict,
+        sql_keys: dict
     ) -> None:
         self.realcon = realcon
-        self.sql_dict = {}
+        # shared between every connection in the pool
+        self.sql_dict = sql_dict
+        self.sql_keys = sql_keys
+
+    async def dump(self) -> None:
+        upsert_row = \
+            """INSERT INTO sqlruntimes (sql, count, time, hist)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (sql) DO UPDATE
+            SET count=sqlruntimes.count+excluded.count,
+            time=sqlruntimes.time+excluded.time,
+            hist=(
+                SELECT array_agg(coalesce(a, 0)+coalesce(b, 0) ORDER BY i)
+                FROM unnest(sqlruntimes.hist, excluded.hist)
+                WITH ORDINALITY AS t(a, b, i)
+            )"""
 
-    async def dump(self) -> None:  # requires external lock
-        add_row = \
-            """INSERT INTO sqlruntimes (sql, count, time)
-            values ($1, $2, $3)"""
-        update_row = \
-            """UPDATE sqlruntimes
-            SET count=$2,
-            time=$3
-            WHERE sql=$1"""
-        check_row = \
-            """SELECT * FROM sqlruntimes
-            WHERE sql=$1"""
-
-        conn = self.realcon
+        # take a snapshot, since other connections keep logging
+        # while this one is dumping
+        to_dump = dict(self.sql_dict)
+        self.sql_dict.clear()
+        if to_dump == {}:
+            return
 
         async with self.realcon.transaction():
-            for sql, d in self.sql_dict.items():
-                row = await conn.fetchrow(check_row, sql)
-                if row is None:
-                    await conn.execute(
-                        add_row, sql, d['c'], d['e']
-                    )
-                else:
-                    await conn.execute(
-                        update_row, sql,
-                        d['c']+row['count'],
-                        d['e']+float(row['time'])
-                    )
-
-        self.sql_dict = {}
+            await self.realcon.executemany(upsert_row, [
+                (sql, d['c'], d['e'] / 1e9, d['h'])
+                for sql, d in to_dump.items()
+            ])
 
     def transaction(
         self, *args, **kwargs
@@ -72,12 +104,22 @@ class CustomConn:
     def log(
         self,
         sql: str,
-        time: float
+        elapsed_ns: int
     ) -> None:
-        sql = sql.lower()
-        self.sql_dict.setdefault(sql, {'c': 0, 'e': 0})
-        self.sql_dict[sql]['c'] += 1
-        self.sql_dict[sql]['e'] += time
+        # Most statements are the same string constant every time,
+        # so they are only lowercased the first time they are seen
+        key = self.sql_keys.get(sql)
+        if key is None:
+            key = sys.intern(sql.lower())
+            self.sql_keys[sql] = key
+        d = self.sql_dict.get(key)
+        if d is None:
+            d = {'c': 0, 'e': 0, 'h': [0] * SQL_HIST_SIZE}
+            self.sql_dict[key] = d
+        d['c'] += 1
+        d['e'] += elapsed_ns
+        index = (elapsed_ns // 1000).bit_length() - 4
+        d['h'][min(max(index, 0), SQL_HIST_SIZE - 1)] += 1
 
     async def prepare(
         self,
@@ -90,9 +132,31 @@ class CustomConn:
         sql: str,
         *args, **kwargs
     ):
-        s = time.time()
+        s = time.perf_counter_ns()
         result = await self.realcon.execute(sql, *args, **kwargs)
-        self.log(sql, time.time() - s)
+        self.log(sql, time.perf_counter_ns() - s)
+        return result
+
+    async def executemany(
+        self,
+        sql: str,
+        *args, **kwargs
+    ):
+        s = time.perf_counter_ns()
+        result = await self.realcon.executemany(sql, *args, **kwargs)
+        self.log(sql, time.perf_counter_ns() - s)
+        return result
+
+    async def copy_records_to_table(
+        self,
+        table_name: str,
+        *args, **kwargs
+    ):
+        s = time.perf_counter_ns()
+        result = await self.realcon.copy_records_to_table(
+            table_name, *args, **kwargs
+        )
+        self.log(f"COPY {table_name}", time.perf_counter_ns() - s)
         return result
 
     async def fetch(
@@ -100,9 +164,9 @@ class CustomConn:
         sql: str,
         *args, **kwargs
     ):
-        s = time.time()
+        s = time.perf_counter_ns()
         result = await self.realcon.fetch(sql, *args, **kwargs)
-        self.log(sql, time.time() - s)
+        self.log(sql, time.perf_counter_ns() - s)
         return result
 
     async def fetchrow(
@@ -110,59 +174,171 @@ class CustomConn:
         sql: str,
         *args, **kwargs
     ):
-        s = time.time()
+        s = time.perf_counter_ns()
         result = await self.realcon.fetchrow(sql, *args, **kwargs)
-        self.log(sql, time.time() - s)
+        self.log(sql, time.perf_counter_ns() - s)
         return result
 
     async def fetchval(self, sql, *args, **kwargs):
-        s = time.time()
+        s = time.perf_counter_ns()
         result = await self.realcon.fetchval(sql, *args, **kwargs)
-        self.log(sql, time.time() - s)
+        self.log(sql, time.perf_counter_ns() - s)
         return result
 
 
 class BotCache(aobject):
+    """An LRU cache of discord messages, keyed by message id.
+
+    Entries expire after ``ttl`` seconds. The cache as a whole holds at
+    most ``max_size`` messages (and ``max_bytes`` bytes of content, if
+    set), and each guild holds at most ``limit`` of them.
+    """
     async def __init__(
         self,
         event,
-        limit: int = 20
+        limit: int = 200,
+        max_size: int = 10000,
+        ttl: float = 600,
+        max_bytes: Optional[int] = None
     ) -> None:
-        self._messages = {}
+        # {msg_id: (guild_id, expires_at, size, message)}
+        self._messages = OrderedDict()
+        # {guild_id: OrderedDict({msg_id: None})}, in LRU order
+        self._guilds = {}
         self.limit = limit
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
         await self.set_listeners(event)
 
+    @staticmethod
+    def _sizeof(
+        item: Any
+    ) -> int:
+        size = len(getattr(item, 'content', '') or '')
+        for embed in getattr(item, 'embeds', []):
+            size += len(str(embed.to_dict()))
+        for attachment in getattr(item, 'attachments', []):
+            size += len(attachment.url) + len(attachment.proxy_url)
+        return size
+
+    def _discard(
+        self,
+        msg_id: int
+    ) -> bool:
+        entry = self._messages.pop(msg_id, None)
+        if entry is None:
+            return False
+        guild = entry[0]
+        self.size -= entry[2]
+        guild_ids = self._guilds[guild]
+        del guild_ids[msg_id]
+        if len(guild_ids) == 0:
+            del self._guilds[guild]
+        return True
+
+    def _evict(
+        self,
+        msg_id: int
+    ) -> None:
+        self._discard(msg_id)
+        self.evictions += 1
+
     async def push(
         self,
         item: Any,
         guild: int
     ) -> None:
-        self._messages.setdefault(guild, [])
-        self._messages[guild].append(item)
-        if len(self._messages[guild]) > self.limit:
-            self._messages[guild].pop(0)
+        self._discard(item.id)
+        size = self._sizeof(item)
+        self._messages[item.id] = (
+            guild, time.monotonic() + self.ttl, size, item
+        )
+        self._guilds.setdefault(guild, OrderedDict())[item.id] = None
+        self.size += size
+
+        guild_ids = self._guilds[guild]
+        while len(guild_ids) > self.limit:
+            self._evict(next(iter(guild_ids)))
+        while len(self._messages) > self.max_size or (
+            self.max_bytes is not None and self.size > self.max_bytes
+            and len(self._messages) > 1
+        ):
+            self._evict(next(iter(self._messages)))
 
     async def get(
         self,
         guild: int,
         **kwargs
     ) -> Any:
-        return utils.get(self._messages.get(guild, []), **kwargs)
+        msg_id = kwargs.pop('id', None)
+        if msg_id is None:
+            # No id to look up by, so fall back to scanning the guild
+            guild_ids = self._guilds.get(guild, {})
+            item = utils.get(
+                [self._messages[mid][3] for mid in guild_ids], **kwargs
+            )
+            if item is None:
+                self.misses += 1
+                return None
+            msg_id = item.id
+
+        entry = self._messages.get(msg_id)
+        if entry is None or entry[0] != guild:
+            self.misses += 1
+            return None
+        if entry[1] < time.monotonic():
+            self._evict(msg_id)
+            self.misses += 1
+            return None
+
+        item = entry[3]
+        if kwargs and utils.get([item], **kwargs) is None:
+            self.misses += 1
+            return None
+
+        self._messages.move_to_end(msg_id)
+        self._guilds[guild].move_to_end(msg_id)
+        self.hits += 1
+        return item
 
     async def remove(
         self,
         msg_id: int,
         guild: int
     ) -> bool:
-        status = False
-        remove_index = None
-        for x, msg in enumerate(self._messages.get(guild, [])):
-            if msg.id == msg_id:
-                remove_index = x
-        if remove_index is not None:
-            self._messages[guild].pop(remove_index)
-            status = True
-        return status
+        entry = self._messages.get(msg_id)
+        if entry is None or entry[0] != guild:
+            return False
+        return self._discard(msg_id)
+
+    def clear(
+        self,
+        guild: Optional[int] = None
+    ) -> None:
+        if guild is None:
+            self._messages.clear()
+            self._guilds.clear()
+            self.size = 0
+            return
+        for msg_id in list(self._guilds.get(guild, {})):
+            self._discard(msg_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'messages': len(self._messages),
+            'guilds': len(self._guilds),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
 
     async def set_listeners(
         self,
@@ -191,149 +367,505 @@ class BotCache(aobject):
                 await self.remove(id, payload.guild_id)
 
 
-class CommonSql(aobject):
-    async def __init__(
+class GuildConfigCache:
+    """Caches the starboard and AutoStar channel configuration of each
+    guild, so the reaction handlers don't have to query it every time.
+
+    Anything that changes starboards, sbemojis, channelbl, rolebl,
+    aschannels or asemojis has to call one of the invalidate methods.
+    """
+    def __init__(
+        self,
+        db: 'Database'
+    ) -> None:
+        self.db = db
+        self._guilds = {}
+        # {guild_id: loads in progress}
+        self._loading = {}
+        # incremented when a guild that is being loaded is invalidated,
+        # so that the load doesn't store stale data. Only kept while
+        # the guild is being loaded.
+        self._versions = {}
+        # {starboard/aschannel id: guild_id} for the cached guilds
+        self._channel_guilds = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(
+        self,
+        guild_id: int
+    ) -> dict:
+        guild_id = int(guild_id)
+        config = self._guilds.get(guild_id)
+        if config is None:
+            self.misses += 1
+            config = await self._load(guild_id)
+        else:
+            self.hits += 1
+        return config
+
+    async def get_starboard(
+        self,
+        guild_id: int,
+        starboard_id: int
+    ) -> Optional[dict]:
+        config = await self.get(guild_id)
+        return config['starboards'].get(int(starboard_id))
+
+    async def get_aschannel(
+        self,
+        guild_id: int,
+        aschannel_id: int
+    ) -> Optional[dict]:
+        config = await self.get(guild_id)
+        return config['aschannels'].get(int(aschannel_id))
+
+    def invalidate(
+        self,
+        guild_id: int
+    ) -> None:
+        guild_id = int(guild_id)
+        if guild_id in self._loading:
+            self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+        config = self._guilds.pop(guild_id, None)
+        if config is not None:
+            for cid in [*config['starboards'], *config['aschannels']]:
+                self._channel_guilds.pop(cid, None)
+
+    def invalidate_channel(
+        self,
+        channel_id: int
+    ) -> None:
+        """Invalidates the guild of a starboard or AutoStar channel.
+        If that guild isn't cached, every guild that is being loaded
+        is invalidated instead, since it could be one of them."""
+        guild_id = self._channel_guilds.get(int(channel_id))
+        if guild_id is not None:
+            self.invalidate(guild_id)
+            return
+        for guild_id in list(self._loading):
+            self.invalidate(guild_id)
+
+    def clear(self) -> None:
+        for guild_id in {*self._guilds, *self._loading}:
+            self.invalidate(guild_id)
+
+    async def _load(
+        self,
+        guild_id: int
+    ) -> dict:
+        get_starboards = \
+            """SELECT * FROM starboards WHERE guild_id=$1"""
+        get_sbemojis = \
+            """SELECT * FROM sbemojis WHERE starboard_id=any($1::numeric[])"""
+        get_channelbl = \
+            """SELECT * FROM channelbl WHERE guild_id=$1"""
+        get_rolebl = \
+            """SELECT * FROM rolebl WHERE guild_id=$1"""
+        get_aschannels = \
+            """SELECT * FROM aschannels WHERE guild_id=$1"""
+        get_asemojis = \
+            """SELECT * FROM asemojis WHERE aschannel_id=any($1::numeric[])"""
+
+        version = self._versions.get(guild_id, 0)
+        self._loading[guild_id] = self._loading.get(guild_id, 0) + 1
+        try:
+            async with self.db.acquire() as conn:
+                async with conn.transaction():
+                    starboards = await conn.fetch(get_starboards, guild_id)
+                    sbemojis = await conn.fetch(
+                        get_sbemojis, [s['id'] for s in starboards]
+                    )
+                    channelbl = await conn.fetch(get_channelbl, guild_id)
+                    rolebl = await conn.fetch(get_rolebl, guild_id)
+                    aschannels = await conn.fetch(get_aschannels, guild_id)
+                    asemojis = await conn.fetch(
+                        get_asemojis, [a['id'] for a in aschannels]
+                    )
+        finally:
+            self._loading[guild_id] -= 1
+            stale = self._versions.get(guild_id, 0) != version
+            if self._loading[guild_id] == 0:
+                del self._loading[guild_id]
+                self._versions.pop(guild_id, None)
+
+        config = {
+            'starboards': {},
+            'sbemojis': {},  # {starboard_id: [sbemoji, ...]}
+            'emojis': set(),  # every starboard emoji in the guild
+            # {starboard_id: {'bl': frozenset(ids), 'wl': frozenset(ids)}}
+            'channelbl': {},
+            'rolebl': {},
+            'aschannels': {},
+            'asemojis': {}  # {aschannel_id: [asemoji, ...]}
+        }
+        for s in starboards:
+            sid = int(s['id'])
+            config['starboards'][sid] = s
+            config['sbemojis'][sid] = []
+            config['channelbl'][sid] = {'bl': set(), 'wl': set()}
+            config['rolebl'][sid] = {'bl': set(), 'wl': set()}
+        for e in sbemojis:
+            config['sbemojis'][int(e['starboard_id'])].append(e)
+            config['emojis'].add(e['name'])
+        for c in channelbl:
+            lists = config['channelbl'].get(int(c['starboard_id']))
+            if lists is not None:
+                ltype = 'wl' if c['is_whitelist'] else 'bl'
+                lists[ltype].add(int(c['channel_id']))
+        for r in rolebl:
+            lists = config['rolebl'].get(int(r['starboard_id']))
+            if lists is not None:
+                ltype = 'wl' if r['is_whitelist'] else 'bl'
+                lists[ltype].add(int(r['role_id']))
+        # Frozen, since every reader of the config shares them
+        for lists in [
+            *config['channelbl'].values(), *config['rolebl'].values()
+        ]:
+            lists['bl'] = frozenset(lists['bl'])
+            lists['wl'] = frozenset(lists['wl'])
+        for a in aschannels:
+            aid = int(a['id'])
+            config['aschannels'][aid] = a
+            config['asemojis'][aid] = []
+        for e in asemojis:
+            config['asemojis'][int(e['aschannel_id'])].append(e)
+
+        if not stale:
+            self._guilds[guild_id] = config
+            for cid in config['starboards']:
+                self._channel_guilds[cid] = guild_id
+            for cid in config['aschannels']:
+                self._channel_guilds[cid] = guild_id
+        return config
+
+
+class MessageRowCache:
+    """A bounded LRU of rows from the messages table, keyed by message
+    id, with an index from (orig_message_id, channel_id) to the id of
+    the matching starboard message.
+
+    Anything that writes to messages has to call put, update, remove
+    or clear, so that the cache never holds an outdated row.
+    """
+    def __init__(
         self,
-        conn: apg.Connection
+        size: int = 10000
     ) -> None:
+        self._rows = OrderedDict()  # {message_id: row}
+        self._starboard_ids = {}  # {(orig_message_id, channel_id): id}
+        self.size = size
+        # incremented on every write, so that a row read from the
+        # database before a write isn't stored after it
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        message_id: int
+    ) -> Optional[dict]:
+        message_id = int(message_id)
+        row = self._rows.get(message_id)
+        if row is None:
+            self.misses += 1
+            return None
+        self._rows.move_to_end(message_id)
+        self.hits += 1
+        return row
+
+    async def fetch(
+        self,
+        conn: CustomConn,
+        message_id: int
+    ) -> Optional[dict]:
+        get_message = \
+            """SELECT * FROM messages WHERE id=$1"""
+
+        row = self.get(message_id)
+        if row is not None:
+            return row
+        writes = self._writes
+        record = await conn.fetchrow(get_message, message_id)
+        if record is None:
+            return None
+        if writes != self._writes:
+            return dict(record)
+        return self.put(record)
+
+    async def fetch_starboard_message(
+        self,
+        conn: CustomConn,
+        orig_message_id: int,
+        channel_id: int
+    ) -> Optional[dict]:
+        get_message = \
+            """SELECT * FROM messages
+            WHERE orig_message_id=$1 AND channel_id=$2"""
+
+        message_id = self._starboard_ids.get(
+            (int(orig_message_id), int(channel_id))
+        )
+        if message_id is not None:
+            row = self.get(message_id)
+            if row is not None:
+                return row
+        writes = self._writes
+        record = await conn.fetchrow(get_message, orig_message_id, channel_id)
+        if record is None:
+            return None
+        if writes != self._writes:
+            return dict(record)
+        return self.put(record)
+
+    def put(
+        self,
+        record: Any
+    ) -> dict:
+        """Stores a full row, as returned by SELECT * or RETURNING *"""
+        row = dict(record)
+        message_id = int(row['id'])
+        self._discard(message_id)
+        self._rows[message_id] = row
+        if row['orig_message_id'] is not None:
+            key = (int(row['orig_message_id']), int(row['channel_id']))
+            self._starboard_ids[key] = message_id
+        while len(self._rows) > self.size:
+            self._discard(next(iter(self._rows)))
+        self._writes += 1
+        return row
+
+    def update(
+        self,
+        message_id: int,
+        **changes
+    ) -> None:
+        row = self._rows.get(int(message_id))
+        if row is not None:
+            row.update(changes)
+        self._writes += 1
+
+    def update_starboard_message(
+        self,
+        orig_message_id: int,
+        channel_id: int,
+        **changes
+    ) -> None:
+        message_id = self._starboard_ids.get(
+            (int(orig_message_id), int(channel_id))
+        )
+        if message_id is not None:
+            self.update(message_id, **changes)
+        self._writes += 1
+
+    def remove(
+        self,
+        message_id: int
+    ) -> None:
+        self._discard(int(message_id))
+        self._writes += 1
+
+    def clear(self) -> None:
+        self._rows.clear()
+        self._starboard_ids.clear()
+        self._writes += 1
+
+    def _discard(
+        self,
+        message_id: int
+    ) -> None:
+        row = self._rows.pop(message_id, None)
+        if row is not None and row['orig_message_id'] is not None:
+            key = (int(row['orig_message_id']), int(row['channel_id']))
+            if self._starboard_ids.get(key) == message_id:
+                del self._starboard_ids[key]
+
+
+class KnownRows:
+    """A set of ids of rows known to exist, which forgets the least
+    recently used ids once it holds more than max_size of them."""
+    def __init__(
+        self,
+        max_size: int
+    ) -> None:
+        self.max_size = max_size
+        self._ids = OrderedDict()
+
+    def __contains__(
+        self,
+        row_id: Any
+    ) -> bool:
+        if row_id not in self._ids:
+            return False
+        self._ids.move_to_end(row_id)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(
+        self,
+        row_id: Any
+    ) -> None:
+        self._ids[row_id] = None
+        self._ids.move_to_end(row_id)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    def update(
+        self,
+        row_ids
+    ) -> None:
+        for row_id in row_ids:
+            self.add(row_id)
+
+
+class CommonSql:
+    """Statements used in several places. These are plain strings,
+    since asyncpg already caches prepared statements per connection
+    and a pooled connection can't share another one's statements."""
+    def __init__(self) -> None:
         self.create_guild = \
-            await conn.prepare(
-                """INSERT INTO guilds (id) VALUES($1)"""
-            )
+            """INSERT INTO guilds (id) VALUES($1)"""
         self.create_user = \
-            await conn.prepare(
-                """INSERT INTO users (id, is_bot)
-                VALUES($1, $2)"""
-            )
+            """INSERT INTO users (id, is_bot)
+            VALUES($1, $2)"""
         self.create_vote = \
-            await conn.prepare(
-                """INSERT INTO votes (user_id, expires)
-                VALUES($1, $2)"""
-            )
+            """INSERT INTO votes (user_id, expires)
+            VALUES($1, $2)"""
         self.create_member = \
-            await conn.prepare(
-                """INSERT INTO members (user_id, guild_id)
-                VALUES($1,$2)"""
-            )
+            """INSERT INTO members (user_id, guild_id)
+            VALUES($1,$2)
+            ON CONFLICT (user_id, guild_id) DO NOTHING"""
         self.create_starboard = \
-            await conn.prepare(
-                """INSERT INTO starboards (id, guild_id)
-                VALUES($1,$2)"""
-            )
+            """INSERT INTO starboards (id, guild_id)
+            VALUES($1,$2)"""
         self.create_sbemoji = \
-            await conn.prepare(
-                """INSERT INTO sbemojis (d_id, starboard_id,
-                name, is_downvote)
-                VALUES($1,$2,$3,$4)"""
-            )
+            """INSERT INTO sbemojis (d_id, starboard_id,
+            name, is_downvote)
+            VALUES($1,$2,$3,$4)"""
         self.create_aschannel = \
-            await conn.prepare(
-                """INSERT INTO aschannels (id, guild_id)
-                VALUES($1, $2)"""
-            )
+            """INSERT INTO aschannels (id, guild_id)
+            VALUES($1, $2)"""
         self.create_asemoji = \
-            await conn.prepare(
-                """INSERT INTO asemojis (aschannel_id, name)
-                VALUES($1, $2)"""
-            )
+            """INSERT INTO asemojis (aschannel_id, name)
+            VALUES($1, $2)"""
         self.create_channelbl = \
-            await conn.prepare(
-                """INSERT INTO channelbl (starboard_id, channel_id, guild_id, is_whitelist)
-                VALUES($1, $2, $3, $4)"""
-            )
+            """INSERT INTO channelbl (starboard_id, channel_id, guild_id, is_whitelist)
+            VALUES($1, $2, $3, $4)"""
         self.create_rolebl = \
-            await conn.prepare(
-                """INSERT INTO rolebl (starboard_id, role_id, guild_id, is_whitelist)
-                VALUES($1, $2, $3, $4)"""
-            )
+            """INSERT INTO rolebl (starboard_id, role_id, guild_id, is_whitelist)
+            VALUES($1, $2, $3, $4)"""
         self.create_message = \
-            await conn.prepare(
-                """INSERT INTO messages (id, guild_id,
-                user_id, orig_message_id, channel_id,
-                is_orig, is_nsfw)
-                VALUES($1,$2,$3,$4,$5,$6,$7)"""
-            )
+            """INSERT INTO messages (id, guild_id,
+            user_id, orig_message_id, channel_id,
+            is_orig, is_nsfw)
+            VALUES($1,$2,$3,$4,$5,$6,$7)
+            RETURNING *"""
         self.create_reaction = \
-            await conn.prepare(
-                """INSERT INTO reactions (guild_id,
-                user_id, message_id, name)
-                VALUES ($1,$2,$3,$4)"""
-            )
+            """INSERT INTO reactions (guild_id,
+            user_id, message_id, name)
+            VALUES ($1,$2,$3,$4)"""
 
         self.update_starboard = \
-            await conn.prepare(
-                """UPDATE starboards
-                SET self_star=$1,
-                link_edits=$2,
-                link_deletes=$3,
-                bots_on_sb=$4,
-                required=$5,
-                rtl=$6,
-                require_image=$7
-                WHERE id=$8"""
-            )
+            """UPDATE starboards
+            SET self_star=$1,
+            link_edits=$2,
+            link_deletes=$3,
+            bots_on_sb=$4,
+            required=$5,
+            rtl=$6,
+            require_image=$7
+            WHERE id=$8"""
 
 
 class Database:
-    def __init__(self) -> None:
-        self.lock = Lock()
+    def __init__(
+        self,
+        min_size: int = 2,
+        max_size: int = 10,
+        cache_options: Optional[dict] = None,
+        message_rows_size: int = 10000,
+        known_rows_size: int = 100000
+    ) -> None:
+        self.min_size = min_size
+        self.max_size = max_size
+        # keyword arguments for BotCache, see its docstring
+        self.cache_options = cache_options or {}
         self.cooldowns = {
             'giving_stars': {}  # {user_id: cooldown_end_datetime}
         }
-        self.conn = None
+        # {(guild_id, user_id): {'given': int, 'received': int, 'xp': int}}
+        # changes not yet written to members, see cogs.levels.flush_xp
+        self.pending_xp = {}
+        # rows known to exist, see functions.check_or_create_existence
+        self.known_guilds = KnownRows(known_rows_size)
+        self.known_users = KnownRows(known_rows_size)
+        self.known_members = KnownRows(known_rows_size)  # (user_id, guild_id)
+        self.pool = None
+        self.sql_dict = {}
+        self.sql_keys = {}  # {sql: lowercased, interned sql}
+        # seconds spent waiting for a free connection
+        self.pool_wait = {'count': 0, 'time': 0.0, 'max': 0.0}
+        self.q = CommonSql()
         self.cache = None
         self.as_cache = None
+        self.config_cache = GuildConfigCache(self)
+        self.message_rows = MessageRowCache(message_rows_size)
 
     async def open(
         self,
         bot: commands.Bot
     ) -> None:
-        # self.q = await CommonSql()
+        self.pool = await self.make_pool()
         await self._create_tables()
         await self._apply_migrations()
-        self.q = await CommonSql(await self.connect())
-        self.cache = await BotCache(bot.event)
+        self.cache = await BotCache(bot.event, **self.cache_options)
 
-    async def connect(self) -> CustomConn:
-        if self.conn is None:
-            self.conn = await self.make_connection()
-        return self.conn
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
 
-    async def make_connection(self) -> CustomConn:
-        conn = None
+    async def make_pool(self) -> apg.Pool:
         try:
-            conn = await apg.connect(
+            pool = await apg.create_pool(
                 host='localhost', database='starboard',
-                user='starboard', password=db_pwd
+                user='starboard', password=db_pwd,
+                min_size=self.min_size, max_size=self.max_size
             )
-            # await conn.execute(
-            #    "PRAGMA foreign_keys=True"
-            # )
-            # conn.row_factory = self._dict_factory
         except Exception as e:
             print(f"Couldn't connect to database: {e}")
-            if conn:
-                await conn.close()
-        customconn = CustomConn(conn)
-        return customconn
-
-    def _dict_factory(self, cursor, row) -> dict:
-        d = {}
-        for idx, col in enumerate(cursor.description):
-            d[col[0]] = row[idx]
-        return d
+            raise
+        return pool
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[CustomConn]:
+        """Acquires a connection from the pool for one unit of work.
+
+        Usage:
+            async with bot.db.acquire() as conn:
+                async with conn.transaction():
+                    ...
+        """
+        start = time.perf_counter()
+        async with self.pool.acquire() as realcon:
+            waited = time.perf_counter() - start
+            self.pool_wait['count'] += 1
+            self.pool_wait['time'] += waited
+            self.pool_wait['max'] = max(self.pool_wait['max'], waited)
+            yield CustomConn(realcon, self.sql_dict, self.sql_keys)
 
     async def _create_table(self, sql: str) -> None:
-        conn = await self.connect()
-        await conn.realcon.execute(sql)
+        async with self.pool.acquire() as conn:
+            await conn.execute(sql)
 
     async def _create_index(self, sql: str) -> None:
-        conn = await self.connect()
-        await conn.realcon.execute(sql)
+        async with self.pool.acquire() as conn:
+            await conn.execute(sql)
 
     async def _apply_migration(self, sql: str) -> None:
-        conn = await self.connect()
-        await conn.realcon.execute(sql)
+        async with self.pool.acquire() as conn:
+            await conn.execute(sql)
 
     async def _apply_migrations(self) -> None:
         messages__addcolumn__points = \
@@ -376,8 +908,27 @@ class Database:
             """ALTER TABLE starboards
             ADD COLUMN IF NOT EXISTS require_image
             BOOL NOT NULL DEFAULT False"""
+        sqlruntimes__addcolumn__hist = \
+            """ALTER TABLE sqlruntimes
+            ADD COLUMN IF NOT EXISTS hist
+            bigint ARRAY DEFAULT NULL"""
+        # Concurrent inserts could create the same member twice, so
+        # the duplicates are removed (keeping the oldest row) before
+        # the unique index is created. Skipped once the index exists.
+        members__dedupe = \
+            """DO $$ BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_indexes WHERE indexname='members_user_guild'
+            ) THEN
+                DELETE FROM members a USING members b
+                WHERE a.user_id=b.user_id AND a.guild_id=b.guild_id
+                AND a.id > b.id;
+            END IF;
+            END $$"""
+        members__unique_user_guild = \
+            """CREATE UNIQUE INDEX IF NOT EXISTS members_user_guild
+            ON members(user_id, guild_id)"""
 
-        await self.lock.acquire()
         await self._apply_migration(messages__addcolumn__points)
         await self._apply_migration(guilds__addcolumn__prefixes)
         await self._apply_migration(deltable__prefixes)
@@ -390,7 +941,9 @@ class Database:
         await self._apply_migration(members__addcolumn__autoredeem)
         await self._apply_migration(guilds__addcolumn__is_qa_on)
         await self._apply_migration(starboards__addcolumn__require_image)
-        self.lock.release()
+        await self._apply_migration(sqlruntimes__addcolumn__hist)
+        await self._apply_migration(members__dedupe)
+        await self._apply_migration(members__unique_user_guild)
 
     async def _create_tables(self) -> None:
         guilds_table = \
@@ -630,7 +1183,9 @@ class Database:
             """CREATE INDEX IF NOT EXISTS messages_guild_id
             ON messages(guild_id)"""
 
-        await self.lock.acquire()
+        members_guild_xp_index = \
+            """CREATE INDEX IF NOT EXISTS members_guild_xp
+            ON members(guild_id, xp DESC)"""
 
         await self._create_table(guilds_table)
         await self._create_table(xproles_table)
@@ -654,6 +1209,5 @@ class Database:
         await self._create_index(msg_orig_msg_id_index)
         await self._create_index(member_uid_index)
         await self._create_index(sbemojis_starboard_index)
-        await self._create_table(messages_guild_id_index)
-
-        self.lock.release()
+        await self._create_index(messages_guild_id_index)
+        await self._create_index(members_guild_xp_index)
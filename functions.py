@@ -1,7 +1,14 @@
+import asyncio
+import copy
 import datetime
+import io
 import re
+from collections import OrderedDict
 from itertools import compress
-from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+from typing import (
+    AbstractSet, Any, Iterable, List, Optional, Pattern, Sequence, Tuple,
+    Union
+)
 
 import asyncpg
 import discord
@@ -38,8 +45,8 @@ async def needs_recount(
     bot: commands.Bot,
     message: discord.Message
 ) -> bool:
-    get_reactions = \
-        """SELECT * FROM reactions WHERE message_id=$1"""
+    count_reactions = \
+        """SELECT COUNT(*) FROM reactions WHERE message_id=$1"""
 
     if message is None:
         return False
@@ -58,13 +65,11 @@ async def needs_recount(
     if total == 0:  # Don't recount if the message doesn't have reactions
         return False
 
-    async with bot.db.lock:
-        conn = bot.db.conn
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
-            reactions = await conn.fetch(
-                get_reactions, message.id
+            sql_total = await conn.fetchval(
+                count_reactions, message.id
             )
-            sql_total = len(reactions)
 
     if sql_total < 0.5*total and total-sql_total > 2:
         # recount if the bot has logged less than 10% of the reactions
@@ -72,16 +77,22 @@ async def needs_recount(
     return False
 
 
+async def get_reaction_users(
+    reaction: discord.Reaction,
+    name: str
+) -> List[Tuple[discord.User, str]]:
+    return [
+        (user, name) async for user in reaction.users()
+        if user is not None and not user.bot
+    ]
+
+
 async def recount_reactions(
     bot: commands.Bot,
     message: discord.Message
 ) -> None:
-    check_reaction = \
-        """SELECT * FROM reactions WHERE
-        message_id=$1 AND name=$2 AND user_id=$3"""
-    check_message = \
-        """SELECT * FROM messages
-        WHERE id=$1"""
+    get_reactions = \
+        """SELECT user_id, name FROM reactions WHERE message_id=$1"""
 
     # hard to explain why, but I also remove the message
     # from the cache when recounting the stars on it
@@ -90,67 +101,64 @@ async def recount_reactions(
     if message is None:
         return
 
-    # [{'user_id': user_id, 'name': name}, ...]
+    names = [
+        str(r.emoji.id) if r.custom_emoji else str(r.emoji)
+        for r in message.reactions
+    ]
+    reaction_mask = await functions.is_starboard_emoji(
+        bot.db, message.guild.id, names, multiple=True
+    )
+
+    # [(user, name), ...], fetched for every emoji at once
     # other values can be determined from the message object
     to_add = []
-
-    for reaction in message.reactions:
-        if reaction.custom_emoji:
-            name = str(reaction.emoji.id)
-        else:
-            name = str(reaction.emoji)
-
-        if not await functions.is_starboard_emoji(
-            bot.db, message.guild.id, name
-        ):
-            continue
-
-        async for user in reaction.users():
-            if user is None:
-                continue
-            elif user.bot:
-                continue
-            to_add.append({
-                'user': user, 'name': name
-            })
-
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    for users in await asyncio.gather(*[
+        get_reaction_users(reaction, name)
+        for reaction, name, is_sbemoji
+        in zip(message.reactions, names, reaction_mask) if is_sbemoji
+    ]):
+        to_add += users
+
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
-            sql_m = await conn.fetchrow(
-                check_message, message.id
-            )
+            sql_m = await bot.db.message_rows.fetch(conn, message.id)
+            new_row = None
             if sql_m and sql_m['is_orig'] is False:
                 print("No")
                 return
             elif sql_m is None:
-                await bot.db.q.create_message.fetch(
+                new_row = await conn.fetchrow(
+                    bot.db.q.create_message,
                     message.id, message.guild.id,
                     message.author.id, None,
                     message.channel.id, True,
                     message.channel.is_nsfw()
                 )
 
-    for r in to_add:
-        await functions.check_or_create_existence(
-            bot,
-            guild_id=message.guild.id,
-            user=r['user'], do_member=True
-        )
+    if new_row is not None:
+        bot.db.message_rows.put(new_row)
 
-        async with bot.db.lock:
-            async with conn.transaction():
-                sql_r = await conn.fetchrow(
-                    check_reaction, message.id, r['name'],
-                    r['user'].id
-                )
-                if sql_r is not None:
-                    continue
+    await create_members(
+        bot, message.guild.id, [user for user, _ in to_add]
+    )
 
-                await bot.db.q.create_reaction.fetch(
-                    message.guild.id, (r['user']).id,
-                    message.id, r['name']
+    # Diff against the rows that already exist, then copy
+    # the missing ones in with a single COPY
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            existing = {
+                (int(r['user_id']), r['name']) for r in
+                await conn.fetch(get_reactions, message.id)
+            }
+            missing = [
+                (message.guild.id, user.id, message.id, name)
+                for user, name in set(to_add)
+                if (user.id, name) not in existing
+            ]
+            if missing != []:
+                await conn.copy_records_to_table(
+                    'reactions', records=missing,
+                    columns=['guild_id', 'user_id', 'message_id', 'name']
                 )
 
     await starboard.handle_starboards(
@@ -169,27 +177,56 @@ async def is_starboard_emoji(
         emoji = str(emoji)
     else:
         emoji = [str(emo) for emo in emoji]
-    get_starboards = \
-        """SELECT * FROM starboards WHERE guild_id=$1"""
-    get_sbeemojis = \
-        """SELECT * FROM sbemojis WHERE starboard_id=any($1::numeric[])"""
 
-    async with db.lock:
-        conn = await db.connect()
-        async with conn.transaction():
-            starboards = await conn.fetch(get_starboards, guild_id)
-            sql_all_emojis = await conn.fetch(
-                get_sbeemojis, [starboard['id'] for starboard in starboards]
-            )
-            all_emojis = [e['name'] for e in sql_all_emojis]
+    config = await db.config_cache.get(guild_id)
+    all_emojis = config['emojis']
     if not multiple:
-        return str(emoji) in all_emojis
+        return emoji in all_emojis
     else:
         return [emo in all_emojis for emo in emoji]
 
 
+# {(message_id, edited_at, nsfw): (embed_dict, [(filename, data)])}
+embed_cache = OrderedDict()
+# bytes is the total size of the attachments held by embed_cache
+embed_cache_stats = {'hits': 0, 'misses': 0, 'bytes': 0}
+
+
 async def get_embed_from_message(
     message: discord.Message
+) -> Tuple[discord.Embed, List[discord.File]]:
+    """Same as render_embed, but reuses the last embed built for
+    the message as long as it hasn't been edited since"""
+    key = (message.id, message.edited_at, message.channel.is_nsfw())
+    cached = embed_cache.get(key)
+    if cached is None:
+        embed_cache_stats['misses'] += 1
+        embed, attachments = await render_embed(message)
+        cached = (
+            embed.to_dict(),
+            [(a.filename, a.fp.read()) for a in attachments]
+        )
+        embed_cache[key] = cached
+        embed_cache_stats['bytes'] += sum(len(d) for _, d in cached[1])
+        while len(embed_cache) > bot_config.EMBED_CACHE_SIZE or\
+                embed_cache_stats['bytes'] > bot_config.EMBED_CACHE_BYTES:
+            _, (_, old_files) = embed_cache.popitem(last=False)
+            embed_cache_stats['bytes'] -= sum(len(d) for _, d in old_files)
+    else:
+        embed_cache_stats['hits'] += 1
+        embed_cache.move_to_end(key)
+
+    # Callers get their own copies, since embeds can be
+    # modified and files can only be sent once
+    embed_dict, files = cached
+    return discord.Embed.from_dict(copy.deepcopy(embed_dict)), [
+        discord.File(io.BytesIO(data), filename=filename)
+        for filename, data in files
+    ]
+
+
+async def render_embed(
+    message: discord.Message
 ) -> Tuple[discord.Embed, List[discord.File]]:
     nsfw = message.channel.is_nsfw()
     embed = discord.Embed(
@@ -304,19 +341,30 @@ async def get_embed_from_message(
     return embed, extra_attachments
 
 
+async def get_reactions(
+    bot: commands.Bot,
+    message_id: int
+) -> List[dict]:
+    """Returns every (user_id, name) reaction on a message
+    that was not made by a bot"""
+    get_reactions = \
+        """SELECT DISTINCT reactions.user_id, reactions.name FROM reactions
+        JOIN users ON users.id=reactions.user_id
+        WHERE reactions.message_id=$1
+        AND users.is_bot=False"""
+
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            return await conn.fetch(get_reactions, message_id)
+
+
 async def calculate_points(
-    conn: asyncpg.Connection,
     sql_message: dict,
     sql_starboard: dict,
     bot: commands.Bot,
-    guild: discord.Guild
+    guild: discord.Guild,
+    reactions: Optional[List[dict]] = None
 ) -> Tuple[int, List[dict]]:
-    get_reactions = \
-        """SELECT * FROM reactions WHERE message_id=$1"""
-    get_user = \
-        """SELECT * FROM users WHERE id=$1"""
-    get_sbemojis = \
-        """SELECT * FROM sbemojis WHERE starboard_id=$1"""
     update_message = \
         """UPDATE messages
         SET points=$1
@@ -324,59 +372,45 @@ async def calculate_points(
         AND channel_id=$3"""
 
     message_id = int(sql_message['id'])
+    starboard_id = int(sql_starboard['id'])
     self_star = sql_starboard['self_star']
 
-    async with bot.db.lock:
-        async with conn.transaction():
-            emojis = await conn.fetch(get_sbemojis, sql_starboard['id'])
-            all_reactions = await conn.fetch(get_reactions, message_id)
-
-    used_users = set()
-
-    total_points = 0
-    for emoji_obj in emojis:
-        emoji_id = int(emoji_obj['d_id']) if emoji_obj['d_id'] is not None\
-            else None
-        emoji_name = None if emoji_id is not None else emoji_obj['name']
-        reactions = [
-            r for r in all_reactions if r['name']
-            in [str(emoji_id), emoji_name]
-        ]
-        for sql_reaction in reactions:
-            user_id = sql_reaction['user_id']
-            if user_id in used_users:
-                continue
-            used_users.add(user_id)
-            if user_id == sql_message['user_id'] and self_star is False:
-                continue
-
-            async with bot.db.lock:
-                async with conn.transaction():
-                    sql_user = await conn.fetchrow(get_user, user_id)
-
-            if sql_user['is_bot'] is True:
-                continue
-
-            member_list = await functions.get_members(
-                [int(sql_user['id'])], guild
-            )
-            try:
-                member = member_list[0]
-                if member and await functions.is_user_blacklisted(
-                    bot, member, int(sql_starboard['id'])
-                ):
-                    continue
-            except IndexError:
-                pass
-
-            total_points += 1
-
-    async with bot.db.lock:
+    config = await bot.db.config_cache.get(int(sql_starboard['guild_id']))
+    emojis = config['sbemojis'].get(starboard_id, [])
+    rolebl = config['rolebl'].get(starboard_id)
+
+    if reactions is None:
+        reactions = await get_reactions(bot, message_id)
+
+    # Every user who reacted with one of this starboard's emojis,
+    # counted once no matter how many of the emojis they used
+    names = {e['name'] for e in emojis}
+    voter_ids = list({
+        int(r['user_id']) for r in reactions
+        if r['name'] in names
+        and (self_star or r['user_id'] != sql_message['user_id'])
+    })
+    total_points = len(voter_ids)
+
+    # Members only need to be resolved if the starboard
+    # actually has role rules to check them against
+    if voter_ids != [] and rolebl and (rolebl['bl'] or rolebl['wl']):
+        members = await functions.get_members(voter_ids, guild)
+        for member in members:
+            if is_role_blacklisted(
+                {r.id for r in member.roles}, rolebl['bl'], rolebl['wl']
+            ):
+                total_points -= 1
+
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 update_message, total_points,
-                message_id, int(sql_starboard['id'])
+                message_id, starboard_id
             )
+    bot.db.message_rows.update_starboard_message(
+        message_id, starboard_id, points=total_points
+    )
 
     return total_points, emojis
 
@@ -420,6 +454,34 @@ async def fetch(
     return msg
 
 
+# {guild_id: (prefixes, pattern matching the start of a command)}
+prefix_cache = {}
+
+
+def _compile_prefixes(
+    bot: commands.Bot,
+    prefixes: List[str]
+) -> Pattern:
+    options = [re.escape(p) for p in prefixes]
+    options.append(f"<@!?{bot.user.id}> ")
+    return re.compile('|'.join(options))
+
+
+def matches_prefix(
+    bot: commands.Bot,
+    message: discord.Message
+) -> Optional[bool]:
+    """Checks if a message starts with one of its guild's prefixes,
+    without awaiting anything. Returns None if the guild's prefixes
+    haven't been loaded yet, or if the message isn't in a guild."""
+    if message.guild is None:
+        return None
+    cached = prefix_cache.get(message.guild.id)
+    if cached is None:
+        return None
+    return cached[1].match(message.content) is not None
+
+
 async def _prefix_callable(
     bot: commands.Bot,
     message: discord.Message
@@ -447,15 +509,22 @@ async def list_prefixes(
     get_guild = \
         """SELECT * FROM guilds WHERE id=$1"""
 
+    cached = prefix_cache.get(guild_id)
+    if cached is not None:
+        return list(cached[0])
+
     await check_or_create_existence(
         bot, guild_id=guild_id
     )
 
-    async with bot.db.lock:
-        async with bot.db.conn.transaction():
-            guild = await bot.db.conn.fetchrow(get_guild, guild_id)
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            guild = await conn.fetchrow(get_guild, guild_id)
 
     prefix_list = [p for p in guild['prefixes']]
+    prefix_cache[guild_id] = (
+        tuple(prefix_list), _compile_prefixes(bot, prefix_list)
+    )
 
     return prefix_list
 
@@ -481,10 +550,10 @@ async def add_prefix(
     await check_or_create_existence(
         bot, guild_id=guild_id
     )
-    async with bot.db.lock:
-        conn = await bot.db.connect()
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(modify_guild, current_prefixes, guild_id)
+    prefix_cache.pop(guild_id, None)
     return True, ''
 
 
@@ -504,10 +573,10 @@ async def remove_prefix(
         SET prefixes=$1
         WHERE id=$2"""
 
-    async with bot.db.lock:
-        conn = await bot.db.connect()
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(modify_guild, current_prefixes, guild_id)
+    prefix_cache.pop(guild_id, None)
 
     return True, ''
 
@@ -524,17 +593,6 @@ def is_emoji(
     return as_emoji in emoji.UNICODE_EMOJI["en"]
 
 
-async def check_single_exists(
-    conn: asyncpg.Connection,
-    sql: str,
-    params: List[Any]
-) -> bool:
-    rows = await conn.fetch(sql, *params)
-    if len(rows) > 0:
-        return True
-    return False
-
-
 async def check_or_create_existence(
     bot: commands.Bot,
     guild_id: int = None,
@@ -544,77 +602,124 @@ async def check_or_create_existence(
     create_new: bool = True,
     user_is_id: bool = False,
 ) -> dict:
-    check_guild = \
-        """SELECT * FROM guilds WHERE id=$1"""
-    check_user = \
-        """SELECT * FROM users WHERE id=$1"""
-    check_starboard = \
-        """SELECT * FROM starboards WHERE id=$1"""
-    check_member = \
-        """SELECT * FROM members WHERE user_id=$1 AND guild_id=$2"""
+    # The main SELECT sees the tables as they were before the
+    # inserts in the WITH clause, so it reports what already existed
+    check_and_create = \
+        """WITH new_guild AS (
+            INSERT INTO guilds (id) SELECT $1::numeric
+            WHERE $5::bool
+            ON CONFLICT DO NOTHING
+        ), new_user AS (
+            INSERT INTO users (id, is_bot) SELECT $2::numeric, $3::bool
+            WHERE $6::bool
+            ON CONFLICT DO NOTHING
+        ), new_starboard AS (
+            INSERT INTO starboards (id, guild_id)
+            SELECT $4::numeric, $1::numeric
+            WHERE $8::bool AND $4::numeric IS NOT NULL
+            ON CONFLICT DO NOTHING
+        ), new_member AS (
+            INSERT INTO members (user_id, guild_id)
+            SELECT $2::numeric, $1::numeric
+            WHERE $7::bool
+            ON CONFLICT (user_id, guild_id) DO NOTHING
+        )
+        SELECT
+        EXISTS(SELECT 1 FROM guilds WHERE id=$1) AS ge,
+        EXISTS(SELECT 1 FROM users WHERE id=$2) AS ue,
+        EXISTS(SELECT 1 FROM starboards WHERE id=$4) AS se,
+        EXISTS(
+            SELECT 1 FROM members WHERE user_id=$2 AND guild_id=$1
+        ) AS me"""
 
     db = bot.db
-    conn = bot.db.conn
 
-    if guild_id is not None:
-        async with bot.db.lock:
+    if user is not None and user_is_id:
+        guild = bot.get_guild(guild_id)
+        users = await functions.get_members([user], guild)
+        user = users[0] if len(users) != 0 else None
+
+    do_guild = guild_id is not None
+    do_user = user is not None
+    do_starboard = starboard_id is not None and do_guild
+    do_member = do_member and do_user and do_guild
+
+    # Guilds, users and members are never deleted, so once one is
+    # known to exist there is no need to ask the database again
+    gexists = True if do_guild and guild_id in db.known_guilds else None
+    uexists = True if do_user and user.id in db.known_users else None
+    mexists = True if do_member and \
+        (user.id, guild_id) in db.known_members else None
+    s_exists = None
+
+    if (do_guild and gexists is None) or (do_user and uexists is None)\
+            or do_starboard or (do_member and mexists is None):
+        async with db.acquire() as conn:
             async with conn.transaction():
-                gexists = await check_single_exists(
-                    conn, check_guild, [guild_id]
+                row = await conn.fetchrow(
+                    check_and_create, guild_id,
+                    user.id if do_user else None,
+                    user.bot if do_user else None,
+                    starboard_id if do_starboard else None,
+                    create_new and do_guild and gexists is None,
+                    create_new and do_user and uexists is None,
+                    create_new and do_member and mexists is None,
+                    create_new and do_starboard
                 )
-                if not gexists and create_new:
-                    await db.q.create_guild.fetch(guild_id)
-    else:
-        gexists = None
-
-    if user is not None:
-        if user_is_id:
-            guild = bot.get_guild(guild_id)
-            users = await functions.get_members([user], guild)
-            if len(users) == 0:
-                uexists = None
-            else:
-                user = users[0]
-                async with bot.db.lock:
-                    async with conn.transaction():
-                        uexists = await check_single_exists(
-                            conn, check_user, [user.id]
-                        )
-                        if not uexists and create_new:
-                            await db.q.create_user.fetch(user.id, user.bot)
-        else:
-            async with bot.db.lock:
-                async with conn.transaction():
-                    uexists = await check_single_exists(
-                        conn, check_user, [user.id]
-                    )
-                    if not uexists and create_new:
-                        await db.q.create_user.fetch(user.id, user.bot)
-    else:
-        uexists = None
+        gexists = row['ge'] if do_guild else None
+        uexists = row['ue'] if do_user else None
+        s_exists = row['se'] if do_starboard else None
+        mexists = row['me'] if do_member else None
+
+    if do_guild and (gexists or create_new):
+        db.known_guilds.add(guild_id)
+    if do_user and (uexists or create_new):
+        db.known_users.add(user.id)
+    if do_member and (mexists or create_new):
+        db.known_members.add((user.id, guild_id))
 
-    if starboard_id is not None and guild_id is not None:
-        async with bot.db.lock:
-            async with conn.transaction():
-                s_exists = await check_single_exists(
-                    conn, check_starboard, [starboard_id]
+    return dict(ge=gexists, ue=uexists, se=s_exists, me=mexists)
+
+
+async def create_members(
+    bot: commands.Bot,
+    guild_id: int,
+    users: List[Union[discord.User, discord.Member]]
+) -> None:
+    """Makes sure the guild, and the users and members rows of every
+    user, exist, using one statement for each table"""
+    insert_users = \
+        """INSERT INTO users (id, is_bot)
+        SELECT * FROM unnest($1::numeric[], $2::bool[])
+        ON CONFLICT DO NOTHING"""
+    insert_members = \
+        """INSERT INTO members (user_id, guild_id)
+        SELECT u, $2::numeric FROM unnest($1::numeric[]) AS u
+        ON CONFLICT (user_id, guild_id) DO NOTHING"""
+
+    db = bot.db
+    await check_or_create_existence(bot, guild_id=guild_id)
+
+    new_users = {u.id: u.bot for u in users if u.id not in db.known_users}
+    new_members = {
+        u.id for u in users if (u.id, guild_id) not in db.known_members
+    }
+    if new_users == {} and new_members == set():
+        return
+
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            if new_users != {}:
+                await conn.execute(
+                    insert_users, list(new_users), list(new_users.values())
                 )
-                if not s_exists and create_new:
-                    await db.q.create_starboard.fetch(starboard_id, guild_id)
-    else:
-        s_exists = None
-    if do_member and user is not None and guild_id is not None:
-        async with bot.db.lock:
-            async with conn.transaction():
-                mexists = await check_single_exists(
-                    conn, check_member, [user.id, guild_id]
+            if new_members != set():
+                await conn.execute(
+                    insert_members, list(new_members), guild_id
                 )
-                if not mexists and create_new:
-                    await db.q.create_member.fetch(user.id, guild_id)
-    else:
-        mexists = None
 
-    return dict(ge=gexists, ue=uexists, se=s_exists, me=mexists)
+    db.known_users.update(new_users)
+    db.known_members.update((uid, guild_id) for uid in new_members)
 
 
 async def handle_role(
@@ -639,8 +744,7 @@ async def set_sb_lock(
     id: int,
     locked: bool
 ) -> None:
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """UPDATE starboards
@@ -648,14 +752,15 @@ async def set_sb_lock(
                 WHERE id=$2""", locked, id
             )
 
+    bot.db.config_cache.invalidate_channel(id)
+
 
 async def set_asc_lock(
     bot: commands.Bot,
     id: int,
     locked: bool
 ) -> None:
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """UPDATE aschannels
@@ -663,6 +768,8 @@ async def set_asc_lock(
                 WHERE id=$2""", locked, id
             )
 
+    bot.db.config_cache.invalidate_channel(id)
+
 
 async def alert_user(
     bot: commands.Bot,
@@ -699,13 +806,12 @@ async def autoredeem(
     one of them does redeem some of their credits
     and alert the user."""
     await bot.wait_until_ready()
-    conn = bot.db.conn
 
     guild = bot.get_guild(guild_id)
     if guild is None:
         return False
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             ar_members = await conn.fetch(
                 """SELECT * FROM members
@@ -786,13 +892,12 @@ async def channel_alert(
     aschannels: bool = True
 ) -> None:
     await bot.wait_until_ready()
-    conn = bot.db.conn
     guild = bot.get_guild(int(guild_id))
 
     all_asc = []
     all_sb = []
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             if aschannels:
                 all_asc = await conn.fetch(
@@ -827,9 +932,8 @@ async def remove_all_locks(
     bot: commands.Bot,
     guild_id: int
 ) -> None:  # only to be used by refresh_guild_premium
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 """UPDATE starboards
@@ -844,14 +948,15 @@ async def remove_all_locks(
                 guild_id
             )
 
+    bot.db.config_cache.invalidate(guild_id)
+
 
 async def move_starboard_lock(
     bot: commands.Bot,
     current_channel: discord.TextChannel,
     new_channel: discord.TextChannel
 ) -> None:
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             is_curr_locked = await conn.fetchval(
                 """SELECT locked FROM starboards
@@ -890,8 +995,7 @@ async def move_aschannel_lock(
     current_channel: discord.TextChannel,
     new_channel: discord.TextChannel
 ) -> None:
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             is_curr_locked = await conn.fetchval(
                 """SELECT locked FROM aschannels
@@ -929,10 +1033,9 @@ async def disable_guild_premium(
     bot: commands.Bot,
     guild_id: int
 ) -> None:
-    conn = bot.db.conn
 
     # Get Values
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             num_starboards = int(await conn.fetchval(
                 """SELECT COUNT(*) FROM starboards
@@ -951,7 +1054,7 @@ async def disable_guild_premium(
 
     # Lock extra starboards
     if sb_to_lock > 0:
-        async with bot.db.lock:
+        async with bot.db.acquire() as conn:
             async with conn.transaction():
                 sb_chosen = await conn.fetch(
                     """SELECT * FROM starboards
@@ -964,7 +1067,7 @@ async def disable_guild_premium(
 
     # Lock extra aschannels
     if asc_to_lock > 0:
-        async with bot.db.lock:
+        async with bot.db.acquire() as conn:
             async with conn.transaction():
                 asc_chosen = await conn.fetch(
                     """SELECT * FROM aschannels
@@ -981,8 +1084,7 @@ async def do_payroll(
     get_patrons = \
         """SELECT * FROM users WHERE payment != 0"""
 
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_patrons = await conn.fetch(get_patrons)
 
@@ -1035,8 +1137,7 @@ async def setcredits(
         SET credits=$1
         WHERE id=$2"""
 
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(
                 update_user, credits, user_id
@@ -1053,8 +1154,7 @@ async def get_credits(
     await check_or_create_existence(
         bot, user=user
     )
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_user = await conn.fetchrow(
                 get_user, user_id
@@ -1080,8 +1180,7 @@ async def give_months(
         SET premium_end=$1
         WHERE id=$2"""
 
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             await conn.execute(modify_guild, new, guild_id)
 
@@ -1107,8 +1206,7 @@ async def is_patron(
     get_user = \
         """SELECT * FROM users WHERE id=$1"""
 
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_user = await conn.fetchrow(
                 get_user, user_id
@@ -1124,8 +1222,7 @@ async def get_prem_endsat(
     get_guild = \
         """SELECT * FROM guilds WHERE id=$1"""
 
-    conn = bot.db.conn
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_guild = await conn.fetchrow(get_guild, guild_id)
 
@@ -1234,59 +1331,41 @@ async def orig_message_id(
     conn: asyncpg.Connection,
     message_id: int
 ) -> Tuple[int, Optional[int]]:
-    get_message = \
-        """SELECT * FROM messages WHERE id=$1"""
-
-    rows = await conn.fetch(get_message, message_id)
-    if len(rows) == 0:
+    sql_message = await db.message_rows.fetch(conn, message_id)
+    if sql_message is None:
         return message_id, None
-    sql_message = rows[0]
     if sql_message['is_orig'] is True:
         return message_id, sql_message['channel_id']
     orig_messsage_id = sql_message['orig_message_id']
-    rows = await conn.fetch(get_message, orig_messsage_id)
-    sql_orig_message = rows[0]
+    sql_orig_message = await db.message_rows.fetch(conn, orig_messsage_id)
     return int(orig_messsage_id), int(sql_orig_message['channel_id'])
 
 
+def is_role_blacklisted(
+    role_ids: AbstractSet[int],
+    rolebl: AbstractSet[int],
+    rolewl: AbstractSet[int]
+) -> bool:
+    if rolewl & role_ids:
+        return False
+    if rolebl & role_ids:
+        return True
+    return rolebl == set() and rolewl != set()
+
+
 async def is_user_blacklisted(
     bot: commands.Bot,
     member: discord.Member,
     starboard_id: int
 ) -> bool:
-    get_blacklisted_roles = \
-        """SELECT * FROM rolebl WHERE starboard_id=$1
-        AND is_whitelist=False"""
-    get_whitelisted_roles = \
-        """SELECT * FROM rolebl WHERE starboard_id=$1
-        AND is_whitelist=True"""
-
-    status = True
-
-    conn = bot.db.conn
-    async with bot.db.lock:
-        async with conn.transaction():
-            sql_rolebl = await conn.fetch(
-                get_blacklisted_roles, starboard_id
-            )
-            sql_rolewl = await conn.fetch(
-                get_whitelisted_roles, starboard_id
-            )
-
-    rolebl = [int(r['role_id']) for r in sql_rolebl]
-    rolewl = [int(r['role_id']) for r in sql_rolewl]
-
-    if rolebl == [] and rolewl != []:
-        status = False
-    else:
-        for rid in rolebl:
-            if rid in [r.id for r in member.roles]:
-                status = False
-    for rid in rolewl:
-        if rid in [r.id for r in member.roles]:
-            status = True
+    config = await bot.db.config_cache.get(member.guild.id)
+    rolebl = config['rolebl'].get(int(starboard_id))
+    if rolebl is None:
+        return False
 
-    return not status
+    return is_role_blacklisted(
+        {r.id for r in member.roles}, rolebl['bl'], rolebl['wl']
+    )
 
 
 async def is_message_blacklisted(
@@ -1294,34 +1373,12 @@ async def is_message_blacklisted(
     message: discord.Message,  # assumes that it is the original,
     starboard_id: int
 ) -> bool:
-    get_blacklisted_channels = \
-        """SELECT * FROM channelbl WHERE starboard_id=$1
-        AND is_whitelist=False"""
-    get_whitelisted_channels = \
-        """SELECT * FROM channelbl WHERE starboard_id=$1
-        AND is_whitelist=True"""
-
-    channel_status = True
-
-    conn = bot.db.conn
-    async with bot.db.lock:
-        async with conn.transaction():
-            sql_channelbl = await conn.fetch(
-                get_blacklisted_channels, starboard_id
-            )
-            sql_channelwl = await conn.fetch(
-                get_whitelisted_channels, starboard_id
-            )
-
-    channelbl = [int(c['channel_id']) for c in sql_channelbl]
-    channelwl = [int(c['channel_id']) for c in sql_channelwl]
-
-    # Check channel status
-    if channelwl != []:
-        if message.channel.id not in channelwl:
-            channel_status = False
-    else:
-        if message.channel.id in channelbl:
-            channel_status = False
+    config = await bot.db.config_cache.get(message.guild.id)
+    channelbl = config['channelbl'].get(int(starboard_id))
+    if channelbl is None:
+        return False
 
-    return not channel_status  # both must be true
+    # A whitelist overrides the blacklist
+    if channelbl['wl']:
+        return message.channel.id not in channelbl['wl']
+    return message.channel.id in channelbl['bl']
@@ -0,0 +1,314 @@
+"""Collects the numbers served on the webhook server's /metrics
+route, in the Prometheus text format"""
+import asyncio
+import datetime
+import time
+from typing import Dict, List, Tuple
+
+from discord.ext import commands, tasks
+
+import functions
+
+# Upper bounds in seconds, shared by every histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(
+    labels: Tuple[Tuple[str, str], ...]
+) -> str:
+    if labels == ():
+        return ''
+    pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return '{' + pairs + '}'
+
+
+def _escape(
+    value: object
+) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+class Counter:
+    def __init__(
+        self,
+        name: str,
+        doc: str
+    ) -> None:
+        self.name = name
+        self.doc = doc
+        self.values: Dict[tuple, float] = {}
+
+    def inc(
+        self,
+        amount: float = 1,
+        **labels
+    ) -> None:
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"
+        ]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        doc: str
+    ) -> None:
+        self.name = name
+        self.doc = doc
+        # {labels: [bucket counts..., +Inf count, sum]}
+        self.values: Dict[tuple, list] = {}
+
+    def observe(
+        self,
+        value: float,
+        **labels
+    ) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self.values.get(key)
+        if series is None:
+            series = [0] * (len(BUCKETS) + 1) + [0.0]
+            self.values[key] = series
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                series[index] += 1
+                break
+        else:
+            series[len(BUCKETS)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"
+        ]
+        for key, series in self.values.items():
+            total = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), series):
+                total += count
+                labels = _labels(key + (('le', bound),))
+                lines.append(f"{self.name}_bucket{labels} {total}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(key)} {total}")
+        return lines
+
+
+def _counter(
+    name: str,
+    doc: str,
+    values: List[Tuple[tuple, float]]
+) -> List[str]:
+    """Renders totals that are counted elsewhere as a counter"""
+    counter = Counter(name, doc)
+    counter.values.update(values)
+    return counter.render()
+
+
+def _gauge(
+    name: str,
+    doc: str,
+    values: List[Tuple[tuple, float]]
+) -> List[str]:
+    lines = [f"# HELP {name} {doc}", f"# TYPE {name} gauge"]
+    for key, value in values:
+        lines.append(f"{name}{_labels(key)} {value}")
+    return lines
+
+
+starboard_latency = Histogram(
+    'starboard_handle_starboard_seconds',
+    "Time taken to update one starboard for one message"
+)
+discord_requests = Histogram(
+    'starboard_discord_request_seconds',
+    "Time taken by Discord API requests, by route"
+)
+starboard_edits = Counter(
+    'starboard_message_edits_total',
+    "Starboard message edits, by whether they were sent or skipped"
+)
+
+
+def instrument_http(
+    bot: commands.Bot
+) -> None:
+    """Times every request the bot makes to the Discord API"""
+    request = bot.http.request
+
+    async def timed_request(route, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        finally:
+            discord_requests.observe(
+                time.perf_counter() - start,
+                route=f"{route.method} {route.path}"
+            )
+
+    bot.http.request = timed_request
+
+
+def _loop_lag(
+    bot: commands.Bot
+) -> List[Tuple[tuple, float]]:
+    """How far each running tasks.loop job is behind schedule"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    values = []
+    for cog_name, cog in bot.cogs.items():
+        for name, value in vars(type(cog)).items():
+            if not isinstance(value, tasks.Loop):
+                continue
+            loop = getattr(cog, name)
+            next_iteration = loop.next_iteration
+            if not loop.is_running() or next_iteration is None:
+                continue
+            lag = (now - next_iteration).total_seconds()
+            values.append(((('loop', f"{cog_name}.{name}"),), max(lag, 0)))
+    return values
+
+
+async def render(
+    bot: commands.Bot
+) -> str:
+    # How long a callback waits to be run, a sign of a busy event loop
+    start = time.perf_counter()
+    await asyncio.sleep(0)
+    event_loop_lag = time.perf_counter() - start
+
+    lines = []
+
+    starboard = bot.get_cog('Starboard')
+    if starboard is not None:
+        stats = starboard.reaction_stats
+        lines += _gauge(
+            'starboard_reactions_pending_messages',
+            "Messages with reactions waiting to be processed",
+            [((), len(starboard.pending_reactions))]
+        )
+        for name, doc in [
+            ('received', "Reaction events received"),
+            ('merged', "Reaction events merged into an earlier one"),
+            ('processed', "Reactions written to the database"),
+            ('flushes', "Batches of reactions processed")
+        ]:
+            lines += _counter(
+                f'starboard_reactions_{name}_total', doc,
+                [((), stats[name])]
+            )
+
+    posroles = bot.get_cog('PositionRoles')
+    if posroles is not None:
+        lines += _gauge(
+            'starboard_posroles_dirty_guilds',
+            "Guilds waiting for their Position Roles to be recalculated",
+            [((), len(posroles.dirty))]
+        )
+        lines += _gauge(
+            'starboard_posroles_dirty_members',
+            "Members with XP changes waiting on a recalculation",
+            [((), sum(len(m) for m in posroles.dirty.values()))]
+        )
+        for name, doc in [
+            ('queued', "XP changes queued for a Position Role update"),
+            ('recomputes', "Position Role recalculations of a guild"),
+            ('edits', "Members whose Position Roles were changed")
+        ]:
+            lines += _counter(
+                f'starboard_posroles_{name}_total', doc,
+                [((), posroles.stats[name])]
+            )
+
+    xproles = bot.get_cog('XPRoles')
+    if xproles is not None:
+        lines += _gauge(
+            'starboard_xproles_dirty_members',
+            "Members waiting for their XP Roles to be checked",
+            [((), sum(len(m) for m in xproles.dirty.values()))]
+        )
+        for name, doc in [
+            ('queued', "XP changes queued for an XP Role update"),
+            ('updated', "Guilds whose XP Roles were checked"),
+            ('edits', "Members whose XP Roles were changed")
+        ]:
+            lines += _counter(
+                f'starboard_xproles_{name}_total', doc,
+                [((), xproles.stats[name])]
+            )
+
+    lines += starboard_latency.render()
+    lines += starboard_edits.render()
+    lines += discord_requests.render()
+
+    db = bot.db
+    lines += _counter(
+        'starboard_db_pool_wait_seconds_total',
+        "Time spent waiting for a database connection",
+        [((), db.pool_wait['time'])]
+    )
+    lines += _counter(
+        'starboard_db_pool_acquires_total',
+        "Database connections acquired from the pool",
+        [((), db.pool_wait['count'])]
+    )
+    lines += _gauge(
+        'starboard_db_pool_wait_seconds_max',
+        "Longest wait for a database connection",
+        [((), db.pool_wait['max'])]
+    )
+    if db.pool is not None:
+        lines += _gauge(
+            'starboard_db_pool_connections',
+            "Connections in the database pool",
+            [
+                ((('state', 'open'),), db.pool.get_size()),
+                ((('state', 'idle'),), db.pool.get_idle_size())
+            ]
+        )
+
+    caches = {
+        'messages': (db.cache.hits, db.cache.misses),
+        'config': (db.config_cache.hits, db.config_cache.misses),
+        'message_rows': (db.message_rows.hits, db.message_rows.misses),
+        'embeds': (
+            functions.embed_cache_stats['hits'],
+            functions.embed_cache_stats['misses']
+        )
+    }
+    lines += _counter(
+        'starboard_cache_hits_total', "Cache lookups that were hits",
+        [((('cache', name),), hits) for name, (hits, _) in caches.items()]
+    )
+    lines += _counter(
+        'starboard_cache_misses_total', "Cache lookups that were misses",
+        [
+            ((('cache', name),), misses)
+            for name, (_, misses) in caches.items()
+        ]
+    )
+    lines += _gauge(
+        'starboard_cache_hit_ratio',
+        "Share of cache lookups that were hits",
+        [
+            ((('cache', name),), hits / (hits + misses) if hits else 0.0)
+            for name, (hits, misses) in caches.items()
+        ]
+    )
+
+    lines += _gauge(
+        'starboard_task_loop_lag_seconds',
+        "How far each background loop is behind schedule",
+        _loop_lag(bot)
+    )
+    lines += _gauge(
+        'starboard_event_loop_lag_seconds',
+        "Time for the event loop to get back to a waiting callback",
+        [((), event_loop_lag)]
+    )
+
+    return '\n'.join(lines) + '\n'
@@ -44,8 +44,7 @@ async def change_starboard_settings(
         elif rtl < -1:
             rtl = -1
 
-    async with db.lock:
-        conn = await db.connect()
+    async with db.acquire() as conn:
         status = True
         async with conn.transaction():
             rows = await conn.fetch(get_starboard, starboard_id)
@@ -82,6 +81,9 @@ async def change_starboard_settings(
                     except Exception as e:
                         print(e)
                         status = False
+
+    if status is not None:
+        db.config_cache.invalidate(ssb['guild_id'])
     return status
 
 
@@ -101,8 +103,7 @@ async def change_aschannel_settings(
         delete_invalid=$3
         WHERE id=$4"""
 
-    conn = db.conn
-    async with db.lock:
+    async with db.acquire() as conn:
         async with conn.transaction():
             sasc = await conn.fetchrow(
                 get_aschannel, aschannel_id
@@ -127,6 +128,8 @@ async def change_aschannel_settings(
                 aschannel_id
             )
 
+    db.config_cache.invalidate(sasc['guild_id'])
+
 
 async def add_aschannel(
     bot: commands.Bot,
@@ -148,7 +151,6 @@ async def add_aschannel(
     limit = await functions.get_limit(
         bot, 'aschannels', guild.id
     )
-    conn = bot.db.conn
 
     if not perms.read_messages:
         raise errors.BotNeedsPerms(
@@ -167,7 +169,7 @@ async def add_aschannel(
         bot, guild_id=guild.id
     )
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             all_aschannels = await conn.fetch(
                 get_aschannels, guild.id
@@ -200,10 +202,13 @@ async def add_aschannel(
                     "AutoStar channel."
                 )
 
-            await bot.db.q.create_aschannel.fetch(
+            await conn.execute(
+                bot.db.q.create_aschannel,
                 channel.id, guild.id
             )
 
+    bot.db.config_cache.invalidate(guild.id)
+
 
 async def remove_aschannel(
     bot: commands.Bot,
@@ -215,12 +220,11 @@ async def remove_aschannel(
     del_aschannel = \
         """DELETE FROM aschannels WHERE id=$1"""
 
-    conn = bot.db.conn
     # just in case we messed something up earlier and it's not in there
     if channel_id in bot.db.as_cache:
         bot.db.as_cache.remove(channel_id)
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_aschannel = await conn.fetchrow(
                 check_aschannel, channel_id, guild_id
@@ -231,6 +235,7 @@ async def remove_aschannel(
 
             await conn.execute(del_aschannel, channel_id)
 
+    bot.db.config_cache.invalidate(guild_id)
     await functions.refresh_guild_premium(bot, guild_id, send_alert=False)
 
 
@@ -244,9 +249,7 @@ async def add_asemoji(
     check_asemoji = \
         """SELECT * FROM asemojis WHERE name=$1 and aschannel_id=$2"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sasc = await conn.fetchrow(
                 check_aschannel, aschannel.id
@@ -262,10 +265,13 @@ async def add_asemoji(
                     "That emoji is already on this AutoStar Channel!"
                 )
 
-            await bot.db.q.create_asemoji.fetch(
+            await conn.execute(
+                bot.db.q.create_asemoji,
                 aschannel.id, name
             )
 
+    bot.db.config_cache.invalidate(aschannel.guild.id)
+
 
 async def remove_asemoji(
     bot: commands.Bot,
@@ -279,9 +285,7 @@ async def remove_asemoji(
     del_asemojis = \
         """DELETE FROM asemojis WHERE id=$1"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sasc = await conn.fetchrow(
                 check_aschannel, aschannel.id
@@ -301,6 +305,8 @@ async def remove_asemoji(
                 del_asemojis, se['id']
             )
 
+    bot.db.config_cache.invalidate(aschannel.guild.id)
+
 
 async def add_starboard(
     bot: commands.Bot,
@@ -340,12 +346,11 @@ async def add_starboard(
     limit = await functions.get_limit(
         bot, 'starboards', guild.id
     )
-    conn = bot.db.conn
 
     await functions.check_or_create_existence(
         bot, channel.guild.id
     )
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             all_starboards = await conn.fetch(
                 get_starboards, guild.id
@@ -377,8 +382,9 @@ async def add_starboard(
                     "and a starboard."
                 )
 
-            await bot.db.q.create_starboard.fetch(channel.id, guild.id)
+            await conn.execute(bot.db.q.create_starboard, channel.id, guild.id)
 
+    bot.db.config_cache.invalidate(guild.id)
     await add_starboard_emoji(bot, channel.id, channel.guild, '⭐')
 
 
@@ -392,9 +398,7 @@ async def remove_starboard(
     del_starboard = \
         """DELETE FROM starboards WHERE id=$1"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_starboard = await conn.fetchrow(
                 check_starboard, channel_id, guild_id
@@ -409,6 +413,7 @@ async def remove_starboard(
                 del_starboard, channel_id
             )
 
+    bot.db.config_cache.invalidate(guild_id)
     await functions.refresh_guild_premium(bot, guild_id, send_alert=False)
 
 
@@ -438,9 +443,8 @@ async def add_starboard_emoji(
         emoji, discord.Emoji) else None
 
     limit = await functions.get_limit(bot, 'emojis', guild.id)
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_starboard = await conn.fetchrow(
                 check_starboard, starboard_id
@@ -469,10 +473,13 @@ async def add_starboard_emoji(
                     "That is already a starboard emoji!"
                 )
 
-            await bot.db.q.create_sbemoji.fetch(
+            await conn.execute(
+                bot.db.q.create_sbemoji,
                 emoji_id, starboard_id, emoji_name, False
             )
 
+    bot.db.config_cache.invalidate(guild.id)
+
 
 async def remove_starboard_emoji(
     bot: commands.Bot,
@@ -488,9 +495,8 @@ async def remove_starboard_emoji(
         """DELETE FROM sbemojis WHERE name=$1 AND starboard_id=$2"""
 
     emoji_name = str(emoji.id) if isinstance(emoji, discord.Emoji) else emoji
-    conn = bot.db.conn
 
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_starboard = await conn.fetchrow(
                 check_starboard, starboard_id
@@ -514,6 +520,8 @@ async def remove_starboard_emoji(
                 del_sbemoji, emoji_name, starboard_id
             )
 
+    bot.db.config_cache.invalidate(guild.id)
+
 
 async def add_channel_blacklist(
     bot: commands.Bot,
@@ -527,9 +535,7 @@ async def add_channel_blacklist(
     check_starboard = \
         """SELECT * FROM starboards WHERE id=$1 AND guild_id=$2"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_channelbl = await conn.fetchrow(
                 check_exists, channel_id, starboard_id
@@ -547,10 +553,13 @@ async def add_channel_blacklist(
                     "That is not a starboard!"
                 )
 
-            await bot.db.q.create_channelbl.fetch(
+            await conn.execute(
+                bot.db.q.create_channelbl,
                 starboard_id, channel_id, guild_id, is_whitelist
             )
 
+    bot.db.config_cache.invalidate(guild_id)
+
 
 async def remove_channel_blacklist(
     bot: commands.Bot,
@@ -562,9 +571,7 @@ async def remove_channel_blacklist(
     delete_channelbl = \
         """DELETE FROM channelbl WHERE channel_id=$1 AND starboard_id=$2"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_channelbl = await conn.fetchrow(
                 check_exists, channel_id, starboard_id
@@ -577,6 +584,8 @@ async def remove_channel_blacklist(
                 delete_channelbl, channel_id, starboard_id
             )
 
+    bot.db.config_cache.invalidate(sql_channelbl['guild_id'])
+
 
 async def add_role_blacklist(
     bot: commands.Bot,
@@ -590,9 +599,7 @@ async def add_role_blacklist(
     check_starboard = \
         """SELECT * FROM starboards WHERE id=$1 AND guild_id=$2"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_rolebl = await conn.fetchrow(
                 check_exists, role_id, starboard_id
@@ -609,10 +616,13 @@ async def add_role_blacklist(
                     "That is not a starboard!"
                 )
 
-            await bot.db.q.create_rolebl.fetch(
+            await conn.execute(
+                bot.db.q.create_rolebl,
                 starboard_id, role_id, guild_id, is_whitelist
             )
 
+    bot.db.config_cache.invalidate(guild_id)
+
 
 async def remove_role_blacklist(
     bot: commands.Bot,
@@ -624,9 +634,7 @@ async def remove_role_blacklist(
     delete_rolebl = \
         """DELETE FROM rolebl WHERE role_id=$1 AND starboard_id=$2"""
 
-    conn = bot.db.conn
-
-    async with bot.db.lock:
+    async with bot.db.acquire() as conn:
         async with conn.transaction():
             sql_rolebl = await conn.fetchrow(
                 check_exists, role_id, starboard_id
@@ -639,3 +647,5 @@ async def remove_role_blacklist(
             await conn.execute(
                 delete_rolebl, role_id, starboard_id
             )
+
+    bot.db.config_cache.invalidate(sql_rolebl['guild_id'])
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The bot is run from the repository root, so its modules
+# import each other as top level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
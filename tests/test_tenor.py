@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+web = pytest.importorskip('aiohttp.web')
+
+from api import tenor  # noqa: E402
+from api.client import client  # noqa: E402
+
+
+async def stand_in_server() -> tuple:
+    """Serves fake Tenor responses on localhost and
+    records the ids of the gifs that were asked for"""
+    calls = []
+
+    async def gifs(request):
+        calls.append(request.query['ids'])
+        await asyncio.sleep(0.05)
+        return web.json_response({'results': [{'media': [{'gif': {
+            'url': f"https://media.tenor.com/{request.query['ids']}.gif"
+        }}]}]})
+
+    app = web.Application()
+    app.router.add_get('/gifs', gifs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, 'localhost', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://localhost:{port}", calls
+
+
+def close_disk() -> None:
+    if tenor._disk is not None:
+        tenor._disk_executor.submit(tenor._disk.close).result()
+        tenor._disk = None
+
+
+@pytest.fixture
+def tenor_state(monkeypatch, tmp_path):
+    monkeypatch.setattr(tenor, 'CACHE_PATH', None)
+    tenor._cache.clear()
+    tenor._inflight.clear()
+    close_disk()
+    yield tmp_path
+    tenor._cache.clear()
+    close_disk()
+
+
+def run(
+    coro_func
+) -> list:
+    """Runs coro_func(url) against a fresh stand-in server, returning
+    what it returned and the gif ids the server was asked for"""
+    async def main():
+        runner, url, calls = await stand_in_server()
+        try:
+            return await coro_func(url), calls
+        finally:
+            await client.close()
+            await runner.cleanup()
+    return asyncio.run(main())
+
+
+def test_concurrent_lookups_share_one_request(tenor_state, monkeypatch):
+    async def lookups(url):
+        monkeypatch.setattr(tenor, 'API_URL', url)
+        return await asyncio.gather(
+            *[tenor.get_gif_url('123') for _ in range(10)]
+        )
+
+    urls, calls = run(lookups)
+    assert set(urls) == {"https://media.tenor.com/123.gif"}
+    assert calls == ['123']
+    assert tenor._inflight == {}
+
+
+def test_cache_evicts_least_recently_used(tenor_state, monkeypatch):
+    monkeypatch.setattr(tenor, 'CACHE_SIZE', 2)
+
+    async def lookups(url):
+        monkeypatch.setattr(tenor, 'API_URL', url)
+        await tenor.get_gif_url('1')
+        await tenor.get_gif_url('2')
+        await tenor.get_gif_url('1')
+        await tenor.get_gif_url('3')
+        await tenor.get_gif_url('1')
+        await tenor.get_gif_url('2')
+
+    _, calls = run(lookups)
+    # '2' was the least recently used when '3' came in
+    assert calls == ['1', '2', '3', '2']
+    assert list(tenor._cache) == ['1', '2']
+
+
+def test_expired_entries_are_looked_up_again(tenor_state, monkeypatch):
+    async def lookups(url):
+        monkeypatch.setattr(tenor, 'API_URL', url)
+        await tenor.get_gif_url('1')
+        expires, gif_url = tenor._cache['1']
+        tenor._cache['1'] = (expires - tenor.CACHE_TTL - 1, gif_url)
+        await tenor.get_gif_url('1')
+
+    _, calls = run(lookups)
+    assert calls == ['1', '1']
+
+
+def test_disk_cache_survives_restarts(tenor_state, monkeypatch):
+    monkeypatch.setattr(tenor, 'CACHE_PATH', str(tenor_state / 'gifs.db'))
+
+    async def first(url):
+        monkeypatch.setattr(tenor, 'API_URL', url)
+        return await tenor.get_gif_url('123')
+
+    url, calls = run(first)
+    assert calls == ['123']
+
+    # A restart starts with an empty memory cache and a new connection
+    tenor._cache.clear()
+    close_disk()
+
+    async def second(url):
+        monkeypatch.setattr(tenor, 'API_URL', url)
+        return await tenor.get_gif_url('123')
+
+    assert run(second) == (url, [])
+
+
+def test_broken_disk_cache_falls_back_to_api(tenor_state, monkeypatch):
+    # A directory can't be opened as an sqlite database
+    monkeypatch.setattr(tenor, 'CACHE_PATH', str(tenor_state))
+
+    async def lookup(url):
+        monkeypatch.setattr(tenor, 'API_URL', url)
+        return await tenor.get_gif_url('123')
+
+    url, calls = run(lookup)
+    assert url == "https://media.tenor.com/123.gif"
+    assert calls == ['123']